@@ -0,0 +1,281 @@
+"""Banc d'essai des opérations de DatabaseManager sur des catalogues synthétiques (sans Tk)
+
+    python benchmark_ocp.py run --sizes 10000 100000 --output resultats.json
+    python benchmark_ocp.py compare avant.json apres.json
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from openpyxl import Workbook
+from database_ocp import DatabaseManager
+
+SIZES = (10000, 100000, 1000000)
+SEED = 2025
+# Au-delà, le catalogue est importé depuis un CSV (l'écriture d'un .xlsx d'un million de lignes prend plusieurs minutes)
+EXCEL_MAX_ROWS = 100000
+
+FAMILLES = ["POM", "VAN", "ROU", "MOT", "FIL", "JOI", "CAP", "CAB", "BOU", "RES", "COU", "ACC"]
+VOCABULAIRE = [
+    "POMPE", "VANNE", "ROULEMENT", "MOTEUR", "FILTRE", "JOINT", "CAPTEUR", "CÂBLE", "BOULON", "RESSORT",
+    "COURROIE", "ACCOUPLEMENT", "CLAPET", "RÉDUCTEUR", "ÉCROU", "GARNITURE", "PALIER", "TUYAU", "BRIDE", "SONDE",
+]
+MATIERES = ["inox", "acier", "fonte", "laiton", "bronze", "PTFE", "EPDM", "nitrile", "aluminium", "polyéthylène"]
+NORMES = ["DN50", "DN80", "PN16", "PN40", "ISO 4014", "DIN 933", "NF E 25", "ATEX", "IP65", "classe 8.8"]
+STATUTS = ["Actif", "Désactivé", "En attente", "Obsolète"]
+UNITES = ["PIECE", "UNITÉ", "KILOGRAMME", "LITRE", "MÈTRE", "MÈTRE CARRÉ", "TONNE", "BAR"]
+SITUATIONS = ["MAGASIN CENTRAL", "ATELIER MÉCANIQUE", "ATELIER ÉLECTRIQUE", "LIGNE 1", "LIGNE 2", "STATION DE POMPAGE", ""]
+
+# Filtres mesurés seuls puis deux à deux (valeurs choisies pour retenir des lignes du catalogue généré)
+FILTERS = {
+    'article': {'article': "VAN00"},
+    'code_sap': {'code_sap': "100001"},
+    'code_sap_vide': {'code_sap_empty': True},
+    'description': {'description': "POMPE"},
+    'description_courte': {'description': "PO"},
+    'description_longue': {'description_longue': "inox"},
+    'statut': {'statut': "Désactivé"},
+    'unite': {'unite': "PIECE"},
+    'quantite_installee': {'quantite_installee': "2"},
+    'quantite_plage': {'quantite_min': 10, 'quantite_max': 20},
+    'quantite_zero': {'quantite_min': 0, 'quantite_max': 0},
+    'situation': {'situation': "ATELIER"},
+    'situation_manquante': {'missing': "situation"},
+}
+
+
+def generate_rows(size, seed=SEED):
+    """Lignes d'un catalogue réaliste et reproductible, dans l'ordre de DatabaseManager.EXCEL_COLUMNS"""
+    rng = random.Random(seed)
+    for i in range(size):
+        words = rng.sample(VOCABULAIRE, 2)
+        description = f"{words[0]} {words[1]} {rng.choice(MATIERES).upper()} {rng.randint(5, 500)} MM"
+        # Descriptions longues de quelques phrases à plusieurs centaines de caractères
+        description_longue = " ".join(
+            f"{rng.choice(VOCABULAIRE).capitalize()} en {rng.choice(MATIERES)} {rng.choice(NORMES)}, "
+            f"pression {rng.randint(1, 40)} bar, longueur {rng.randint(10, 2000)} mm."
+            for _ in range(rng.randint(1, 8))
+        )
+        draw = rng.random()
+        # Codes SAP manquants : vides ou "nan" hérités des exports pandas
+        code_sap = "" if draw < 0.08 else "nan" if draw < 0.12 else str(10000000 + i)
+        statut = rng.choices(STATUTS, weights=(80, 12, 5, 3))[0]
+        quantite = "" if rng.random() < 0.3 else str(rng.choice([rng.randint(1, 50), rng.randint(1, 20) / 2]))
+        yield (
+            f"{rng.choice(FAMILLES)}{rng.randint(0, 9999999):07d}", code_sap, description, description_longue,
+            rng.choice(UNITES), statut, quantite, rng.choice(SITUATIONS), "",
+        )
+
+
+def write_source(path, size, seed=SEED):
+    """Écrire le catalogue dans le format lu par migrate_from_excel (.xlsx ou .csv selon l'extension)"""
+    header = [name for name, _ in DatabaseManager.EXCEL_COLUMNS]
+    if path.endswith(".csv"):
+        import csv
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(generate_rows(size, seed))
+        return
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(header)
+    for row in generate_rows(size, seed):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def measure(function, repeat=3, setup=None):
+    """Exécuter function repeat fois -> (durées en secondes, dernier résultat)"""
+    timings, result = [], None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def summarize(timings, result=None):
+    entry = {'seconds': min(timings), 'median': statistics.median(timings), 'runs': len(timings)}
+    if isinstance(result, int) and not isinstance(result, bool):
+        entry['rows'] = result
+    elif isinstance(result, (list, dict)):
+        entry['rows'] = len(result)
+    elif isinstance(result, tuple) and result and isinstance(result[0], list):
+        entry['rows'] = len(result[0])
+    return entry
+
+
+def filter_combinations():
+    """Chaque filtre seul, puis chaque paire de filtres portant sur des colonnes différentes"""
+    for name, filters in FILTERS.items():
+        yield name, filters
+    for (name_a, filters_a), (name_b, filters_b) in itertools.combinations(FILTERS.items(), 2):
+        if {"code_sap", "code_sap_empty"} >= set(filters_a) | set(filters_b) or set(filters_a) & set(filters_b):
+            continue
+        yield f"{name_a}+{name_b}", {**filters_a, **filters_b}
+
+
+def run_size(size, workdir, repeat, seed, reuse, log):
+    """Mesurer toutes les opérations sur un catalogue de size lignes -> {opération: mesure}"""
+    results = {}
+    source = os.path.join(workdir, f"catalogue_{size}_{seed}" + (".xlsx" if size <= EXCEL_MAX_ROWS else ".csv"))
+    db_path = os.path.join(workdir, f"catalogue_{size}_{seed}.db")
+    if not (reuse and os.path.exists(db_path)):
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+        if not os.path.exists(source):
+            log(f"  génération de {os.path.basename(source)}")
+            write_source(source, size, seed)
+        db = DatabaseManager(db_path)
+        log("  migrate_from_excel")
+        timings, ok = measure(lambda: db.migrate_from_excel(source), repeat=1)
+        if not ok:
+            raise RuntimeError(f"Import impossible : {db.migration_stats}")
+        results[f"migrate_from_excel[{os.path.splitext(source)[1][1:]}]"] = dict(summarize(timings), rows=size)
+    else:
+        db = DatabaseManager(db_path)
+    # Mesures à froid : les caches de DatabaseManager sont vidés avant chaque exécution
+    cold = db.invalidate_caches
+
+    def record(name, function, setup=cold, runs=repeat):
+        timings, result = measure(function, runs, setup)
+        results[name] = summarize(timings, result)
+
+    log("  recherches et comptages")
+    record("count_pieces[tout]", lambda: db.count_pieces()[0])
+    for name, filters in filter_combinations():
+        record(f"count_pieces[{name}]", lambda: db.count_pieces(filters)[0])
+        record(f"search_pieces[{name}]", lambda: db.search_pieces(filters, limit=100))
+    record("search_pieces[tout]", lambda: db.search_pieces(limit=100))
+    record("search_pieces[tout, cache]", lambda: db.search_pieces(limit=100), setup=None)
+    first_page = db.search_pieces(limit=100, columns=("id", "article"))[0]
+    after = (first_page[-1][1], first_page[-1][0])
+    record("search_pieces[page suivante]", lambda: db.search_pieces(limit=100, after=after))
+    record("search_pieces[dernière page]", lambda: db.search_pieces(limit=100, from_end=True))
+    record("search_pieces[offset milieu]", lambda: db.search_pieces(limit=100, offset=size // 2))
+    record("search_pieces[pertinence]", lambda: db.search_pieces(FILTERS['description'], limit=100, sort="pertinence"))
+    record("search_pieces[clés 20000]", lambda: db.search_pieces(FILTERS['statut'], limit=20000, columns=("id", "article")))
+    record("count_pieces[estimé]", lambda: db.count_pieces({'statut': "Actif"}, estimate=True)[0])
+    base = [row[0] for row in db.search_pieces({'description': "POMPE"}, limit=20000, columns=("id",))[0]]
+    record("refine_pieces", lambda: db.refine_pieces({'description': "POMPE VANNE"}, base))
+
+    log("  lectures")
+    ids = [row[0] for row in db.search_pieces(limit=200, offset=size // 3, columns=("id",))[0]]
+    record("get_piece_by_id", lambda: db.get_piece_by_id(ids[0]))
+    record("get_pieces_by_ids[200]", lambda: db.get_pieces_by_ids(ids))
+    record("iter_pieces[tout]", lambda: sum(len(rows) for rows in db.iter_pieces()))
+    codes = [row[0] for row in db.search_pieces(limit=500, offset=size // 4, columns=("article",))[0]]
+    record("find_pieces_by_codes[500]", lambda: db.find_pieces_by_codes(codes))
+    record("image_paths_in_use", db.image_paths_in_use)
+    record("reconcile_image_flags", db.reconcile_image_flags)
+
+    log("  écritures")
+    piece = ("BENCH0000001", "99999999", "POMPE BENCH", "Pièce de banc d'essai.", "PIECE", "Actif", "1", "LIGNE 1", "")
+    created = []
+    record("insert_piece", lambda: created.append(db.insert_piece(piece)) or 1, setup=None)
+    edits = itertools.cycle(["Désactivé", "Actif"])
+    record("update_piece", lambda: db.update_piece(created[0], piece[:5] + (next(edits),) + piece[6:]) or 1, setup=None)
+    record("delete_piece", lambda: db.delete_piece(created.pop()) or 1, setup=None)
+    selection = [row[0] for row in db.search_pieces(limit=2000, offset=size // 5, columns=("id",))[0]]
+    situations = itertools.cycle(["BANC A", "BANC B"])
+    record("bulk_update[sélection 2000]", lambda: db.bulk_update({'situation': next(situations)}, piece_ids=selection), setup=None)
+    record("bulk_update[filtre]", lambda: db.bulk_update({'situation': next(situations)}, filters={'statut': "Obsolète"}), setup=None)
+
+    log("  historique et export")
+    record("search_history", lambda: db.search_history())
+    record("search_history[action]", lambda: db.search_history(action="Modification groupée"))
+    record("history_actions", db.history_actions)
+    export_path = os.path.join(workdir, "export.xlsx")
+    record("export_to_excel[filtre]", lambda: db.export_to_excel(export_path, {'statut': "Obsolète"}), runs=1)
+    if size <= EXCEL_MAX_ROWS:
+        record("export_to_excel[tout]", lambda: db.export_to_excel(export_path), runs=1)
+    db.close()
+    return results
+
+
+def run(args):
+    workdir = args.workdir or tempfile.mkdtemp(prefix="benchmark_ocp_")
+    os.makedirs(workdir, exist_ok=True)
+    log = (lambda message: None) if args.quiet else (lambda message: print(message, file=sys.stderr, flush=True))
+    report = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec="seconds"), 'seed': args.seed, 'repeat': args.repeat,
+            'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+        },
+        'results': {},
+    }
+    try:
+        for size in args.sizes:
+            log(f"Catalogue de {size} lignes")
+            report['results'][str(size)] = run_size(size, workdir, args.repeat, args.seed, args.reuse, log)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+def compare(args):
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)['results']
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)['results']
+    regressions = 0
+    print(f"{'taille':>8}  {'opération':<60} {'avant (ms)':>11} {'après (ms)':>11} {'ratio':>7}")
+    for size in sorted(set(before) & set(after), key=int):
+        for name in sorted(set(before[size]) & set(after[size])):
+            old, new = before[size][name]['seconds'], after[size][name]['seconds']
+            ratio = new / old if old else float('inf')
+            # Écarts sous la milliseconde : bruit de mesure
+            flag = ""
+            if ratio > 1 + args.threshold and new - old > 0.001:
+                flag, regressions = "  plus lent", regressions + 1
+            elif ratio < 1 - args.threshold and old - new > 0.001:
+                flag = "  plus rapide"
+            print(f"{size:>8}  {name:<60} {old * 1000:>11.2f} {new * 1000:>11.2f} {ratio:>7.2f}{flag}")
+    print(f"\n{regressions} opération(s) plus lente(s) de plus de {args.threshold:.0%}")
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Banc d'essai de DatabaseManager sur des catalogues synthétiques")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="mesurer les opérations et écrire les résultats en JSON")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES), help="tailles de catalogue (lignes)")
+    run_parser.add_argument("--repeat", type=int, default=3, help="exécutions par mesure (la meilleure est retenue)")
+    run_parser.add_argument("--seed", type=int, default=SEED, help="graine du générateur")
+    run_parser.add_argument("--output", help="fichier JSON de résultats (sinon sortie standard)")
+    run_parser.add_argument("--workdir", help="dossier des catalogues et bases (conservés)")
+    run_parser.add_argument("--reuse", action="store_true", help="réutiliser les bases déjà présentes dans --workdir")
+    run_parser.add_argument("--quiet", action="store_true", help="ne pas afficher la progression")
+    compare_parser = commands.add_parser("compare", help="comparer deux fichiers de résultats")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="écart relatif signalé (0.10 = 10%%)")
+    compare_parser.add_argument("--fail-on-regression", action="store_true", help="code de sortie 1 si une opération ralentit")
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+"""Ligne de commande sur DatabaseManager pour les traitements par lots (sans Tk, sans PIL, sans interface)
+
+    python cli_ocp.py search --description POMPE --format csv > pompes.csv
+    python cli_ocp.py count --statut Actif
+    python cli_ocp.py import catalogue.xlsx
+    python cli_ocp.py export pieces.xlsx --situation MAGASIN
+    python cli_ocp.py bulk-update --code-sap-vide --set statut_article=Désactivé
+    python cli_ocp.py maintenance --repair
+
+Les résultats partent sur la sortie standard au fil de l'eau ; progression et durées sur la sortie d'erreur.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from database_ocp import DatabaseManager, ImageStore
+
+# Options de filtre : même nom (et même sémantique "contient") que les filtres de DatabaseManager
+FILTER_OPTIONS = (
+    ("--article", "article contient"), ("--code-sap", "code SAP contient"), ("--description", "description contient"),
+    ("--description-longue", "description longue contient"), ("--statut", "statut contient"), ("--unite", "unité contient"),
+    ("--quantite-installee", "quantité installée contient"), ("--situation", "situation contient"),
+)
+DEFAULT_COLUMNS = DatabaseManager.PIECE_COLUMNS[:10]
+# Mêmes emplacements que l'interface : l'état du parcours incrémental des images est partagé
+IMAGES_FOLDER = "images_pieces"
+IMAGE_SCAN_STATE_FILE = "images_scan_state.json"
+
+
+class Reporter:
+    """Progression et durées sur la sortie d'erreur (la sortie standard reste réservée aux données)"""
+    PROGRESS_INTERVAL = 0.5
+
+    def __init__(self, quiet=False):
+        self.quiet = quiet
+        self.start = time.perf_counter()
+        self.last = None
+
+    def progress(self, done, total=None, *_):
+        now = time.perf_counter()
+        if self.quiet or (self.last is not None and now - self.last < self.PROGRESS_INTERVAL):
+            return
+        self.last = now
+        rate = done / max(now - self.start, 1e-6)
+        of_total = f" / {total}" if total else ""
+        sys.stderr.write(f"\r{done}{of_total} lignes - {rate:.0f} lignes/s")
+        sys.stderr.flush()
+
+    def done(self, label, count=None):
+        elapsed = time.perf_counter() - self.start
+        if self.last is not None:
+            sys.stderr.write("\n")
+        if count is None:
+            print(f"{label} : {elapsed:.2f} s", file=sys.stderr)
+        else:
+            print(f"{label} : {count} ligne(s) en {elapsed:.2f} s ({count / max(elapsed, 1e-6):.0f} lignes/s)", file=sys.stderr)
+
+
+def filters_from_args(args):
+    filters = {}
+    for option, _ in FILTER_OPTIONS:
+        key = option[2:].replace("-", "_")
+        value = getattr(args, key)
+        if value and value.strip():
+            filters[key] = value.strip()
+    if args.code_sap_vide:
+        filters['code_sap_empty'] = True
+    if args.manquant:
+        filters['missing'] = args.manquant
+    if args.quantite_min is not None:
+        filters['quantite_min'] = args.quantite_min
+    if args.quantite_max is not None:
+        filters['quantite_max'] = args.quantite_max
+    return filters
+
+
+def row_writer(stream, output_format, columns, header=True):
+    """Fonction d'écriture d'une ligne au format demandé (tsv, csv ou jsonl)"""
+    if output_format == "jsonl":
+        return lambda row: stream.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + "\n")
+    writer = csv.writer(stream, delimiter="\t" if output_format == "tsv" else ",", lineterminator="\n")
+    if header:
+        writer.writerow(columns)
+    return writer.writerow
+
+
+def search(db, args):
+    columns = args.columns or DEFAULT_COLUMNS
+    reporter = Reporter(args.quiet)
+    write = row_writer(sys.stdout, args.format, columns, header=not args.no_header)
+    count = 0
+    # Lecture par lots du curseur : rien n'est accumulé en mémoire
+    for rows in db.iter_pieces(filters_from_args(args), columns=columns):
+        if args.limit is not None:
+            rows = rows[:args.limit - count]
+        for row in rows:
+            write(row)
+        count += len(rows)
+        sys.stdout.flush()
+        reporter.progress(count)
+        if args.limit is not None and count >= args.limit:
+            break
+    reporter.done("Recherche", count)
+    return 0
+
+
+def count(db, args):
+    reporter = Reporter(args.quiet)
+    total, estimated = db.count_pieces(filters_from_args(args), estimate=args.estimate)
+    print(total)
+    reporter.done("Comptage (estimé)" if estimated else "Comptage")
+    return 0
+
+
+def import_file(db, args):
+    reporter = Reporter(args.quiet)
+    if not db.migrate_from_excel(args.file, reporter.progress):
+        error = (db.migration_stats or {}).get('error', "fichier introuvable")
+        print(f"Erreur d'import : {error}", file=sys.stderr)
+        return 1
+    if db.migration_stats is None:
+        # Même règle que l'interface : l'import initial ne complète pas une base existante
+        print("La base contient déjà des pièces : import ignoré.", file=sys.stderr)
+        return 1
+    reporter.done("Import", db.migration_stats['rows'])
+    return 0
+
+
+def export(db, args):
+    reporter = Reporter(args.quiet)
+    exported = db.export_to_excel(args.file, filters_from_args(args), reporter.progress)
+    reporter.done("Export", exported)
+    return 0
+
+
+def read_ids(path):
+    """Ids en première colonne (une ligne par pièce) : accepte la sortie de search ; en-tête ignoré"""
+    stream = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8')
+    try:
+        ids = []
+        for line in stream:
+            first = line.split("\t")[0].split(",")[0].strip()
+            if first.isdigit():
+                ids.append(int(first))
+        return ids
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def bulk_update(db, args):
+    reporter = Reporter(args.quiet)
+    changes = dict(args.set)
+    piece_ids = read_ids(args.ids_from) if args.ids_from else None
+    filters = filters_from_args(args)
+    if args.dry_run:
+        print(len(piece_ids) if piece_ids is not None else db.count_pieces(filters)[0])
+        reporter.done("Simulation")
+        return 0
+    updated = db.bulk_update(changes, piece_ids=piece_ids, filters=filters, action=args.action)
+    print(updated)
+    reporter.done("Modification groupée", updated)
+    return 0
+
+
+def maintenance(db, args):
+    # Mêmes étapes que l'interface : images de l'ancien format, indicateurs has_image, puis vérification du dossier
+    reporter = Reporter(args.quiet)
+    store = ImageStore(args.images, db)
+    migrated = store.migrate_legacy()
+    flags = db.reconcile_image_flags()
+    report = store.scan(args.state)
+    for path in report['orphans']:
+        print(f"orphelin\t{path}")
+    for path, references in report['dangling']:
+        print(f"manquant\t{path}\t{references}")
+    sys.stdout.flush()
+    print(f"{migrated} image(s) rangée(s) ou chemin(s) corrigé(s), {flags} indicateur(s) corrigé(s), {report['files']} fichier(s), "
+          f"{report['references']} référence(s), {len(report['orphans'])} orphelin(s), "
+          f"{len(report['dangling'])} référence(s) sans fichier", file=sys.stderr)
+    anomalies = report['orphans'] or report['dangling']
+    if args.repair and anomalies:
+        removed, cleared = store.repair(report)
+        print(f"Réparation : {removed} fichier(s) supprimé(s), {cleared} pièce(s) corrigée(s)", file=sys.stderr)
+        anomalies = False
+    reporter.done("Maintenance")
+    # Code de sortie 1 si des anomalies restent : exploitable par une tâche planifiée
+    return 1 if anomalies else 0
+
+
+def bulk_assignment(text):
+    field, sep, value = text.partition("=")
+    if not sep or field not in DatabaseManager.BULK_FIELDS:
+        raise argparse.ArgumentTypeError(f"attendu champ=valeur avec un champ parmi : {', '.join(DatabaseManager.BULK_FIELDS)}")
+    return field, value
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Traitements par lots sur la base des pièces OCP (sans interface)")
+    parser.add_argument("--db", default="ocp_pieces.db", help="base SQLite (défaut : ocp_pieces.db)")
+    parser.add_argument("--quiet", action="store_true", help="ne pas afficher la progression")
+    filters = argparse.ArgumentParser(add_help=False)
+    for option, help_text in FILTER_OPTIONS:
+        filters.add_argument(option, help=help_text)
+    filters.add_argument("--code-sap-vide", action="store_true", help="pièces sans code SAP")
+    filters.add_argument("--manquant", choices=DatabaseManager.NULLABLE_FIELDS, help="pièces dont ce champ est vide")
+    filters.add_argument("--quantite-min", type=float, help="quantité installée minimale (incluse)")
+    filters.add_argument("--quantite-max", type=float, help="quantité installée maximale (incluse)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = commands.add_parser("search", parents=[filters], help="écrire les pièces filtrées sur la sortie standard")
+    search_parser.add_argument("--format", choices=("tsv", "csv", "jsonl"), default="tsv", help="format de sortie (défaut : tsv)")
+    search_parser.add_argument("--columns", nargs="+", choices=DatabaseManager.PIECE_COLUMNS, help="colonnes (défaut : id à image_path)")
+    search_parser.add_argument("--limit", type=int, help="nombre maximal de lignes")
+    search_parser.add_argument("--no-header", action="store_true", help="sans ligne d'en-tête (tsv, csv)")
+    search_parser.set_defaults(handler=search)
+
+    count_parser = commands.add_parser("count", parents=[filters], help="nombre de pièces filtrées")
+    count_parser.add_argument("--estimate", action="store_true", help="total estimé par échantillonnage (filtres larges)")
+    count_parser.set_defaults(handler=count)
+
+    import_parser = commands.add_parser("import", help="import initial d'un classeur (.xlsx, .xls, .csv) dans une base vide")
+    import_parser.add_argument("file")
+    import_parser.set_defaults(handler=import_file)
+
+    export_parser = commands.add_parser("export", parents=[filters], help="exporter les pièces filtrées vers un classeur .xlsx")
+    export_parser.add_argument("file")
+    export_parser.set_defaults(handler=export)
+
+    bulk_parser = commands.add_parser("bulk-update", parents=[filters], help="modifier en une transaction les pièces filtrées")
+    bulk_parser.add_argument("--set", type=bulk_assignment, action="append", required=True, metavar="CHAMP=VALEUR",
+                             help="valeur à appliquer (option répétable)")
+    bulk_parser.add_argument("--ids-from", metavar="FICHIER", help="ids en première colonne ('-' : entrée standard, ex. sortie de search)")
+    bulk_parser.add_argument("--all", action="store_true", help="autoriser la modification de toutes les pièces (sans filtre)")
+    bulk_parser.add_argument("--dry-run", action="store_true", help="afficher le nombre de pièces visées sans rien modifier")
+    bulk_parser.add_argument("--action", default="Modification groupée", help="libellé enregistré dans l'historique")
+    bulk_parser.set_defaults(handler=bulk_update)
+
+    maintenance_parser = commands.add_parser("maintenance", help="vérifier les images (code de sortie 1 si des anomalies restent)")
+    maintenance_parser.add_argument("--images", default=IMAGES_FOLDER, help=f"dossier d'images (défaut : {IMAGES_FOLDER})")
+    maintenance_parser.add_argument("--state", default=IMAGE_SCAN_STATE_FILE, help="état du parcours incrémental du dossier")
+    maintenance_parser.add_argument("--repair", action="store_true", help="supprimer les orphelins et retirer les références sans fichier")
+    maintenance_parser.set_defaults(handler=maintenance)
+    return parser
+
+
+def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.command != "import" and not os.path.exists(args.db):
+        parser.error(f"base introuvable : {args.db}")
+    if args.command == "bulk-update" and not (args.ids_from or args.all or filters_from_args(args)):
+        parser.error("bulk-update : précisez des filtres, --ids-from ou --all")
+    if hasattr(sys.stdout, "reconfigure"):
+        sys.stdout.reconfigure(encoding="utf-8")
+    db = DatabaseManager(args.db)
+    try:
+        return args.handler(db, args)
+    except BrokenPipeError:
+        # Lecteur fermé avant la fin (| head...) : arrêt sans erreur
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 0
+    except KeyboardInterrupt:
+        print("Interrompu.", file=sys.stderr)
+        return 130
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
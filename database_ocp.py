@@ -0,0 +1,1348 @@
+import sqlite3
+import os
+import shutil
+import threading
+import itertools
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import math
+import time
+import hashlib
+import json
+import re
+import tempfile
+
+# Nombre en tête d'une quantité saisie en texte : "12", "12,5", "1 200", "3 PCS"
+QUANTITE_PATTERN = re.compile(r"^\s*([-+]?\d+(?:[ \u00a0]\d{3})*(?:[.,]\d+)?)")
+
+def parse_quantite(value):
+    # Valeur numérique d'une quantité (colonne quantite_num), None si le texte ne commence pas par un nombre.
+    # Fonction de module : également enregistrée comme fonction SQL pour les mises à jour en masse.
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = QUANTITE_PATTERN.match(str(value))
+    if not match:
+        return None
+    return float(match.group(1).replace(" ", "").replace("\u00a0", "").replace(",", "."))
+
+def empty_to_none(value):
+    # Valeur vide canonique : None (NULL en base) pour '', les espaces, NaN et le texte 'nan' des anciens imports pandas
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if isinstance(value, str) and value.strip().lower() in ("", "nan"):
+        return None
+    return value
+
+def resize_image_file(source, destination, max_size=(800, 600)):
+    # Fonction de module pour pouvoir s'exécuter dans un processus séparé (import d'images en lot).
+    # PIL n'est chargé qu'ici : les traitements sans image (ligne de commande, serveur) s'en passent.
+    from PIL import Image
+    with Image.open(source) as img:
+        if img.width > max_size[0] or img.height > max_size[1]:
+            img.thumbnail(max_size, Image.Resampling.LANCZOS)
+            img.save(destination, optimize=True, quality=85)
+            return destination
+    if os.path.abspath(source) != os.path.abspath(destination):
+        shutil.copy2(source, destination)
+    return destination
+
+def file_sha256(path):
+    # Empreinte du contenu, lue par blocs
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def store_image_file(source, folder, max_size=(800, 600)):
+    # Range l'image redimensionnée sous l'empreinte de son contenu : folder/<2 caractères>/<sha256><ext>.
+    # Une image déjà présente n'est pas dupliquée. Fonction de module, utilisable dans un processus séparé.
+    ext = os.path.splitext(source)[1].lower()
+    fd, temp = tempfile.mkstemp(prefix=".tmp-", suffix=ext, dir=folder)
+    os.close(fd)
+    try:
+        resize_image_file(source, temp, max_size)
+        digest = file_sha256(temp)
+        os.makedirs(os.path.join(folder, digest[:2]), exist_ok=True)
+        final = os.path.join(folder, digest[:2], digest + ext)
+        if os.path.exists(final):
+            os.remove(temp)
+        else:
+            os.replace(temp, final)
+        return final
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+class DatabaseManager:
+    """Gestionnaire de base de données SQLite"""
+    # Colonnes couvertes par l'index plein texte (filtres de recherche libre)
+    FTS_COLUMNS = ("article", "code_sap", "description", "description_longue", "situation")
+    # Le tokenizer trigram indexe des sous-chaînes de 3 caractères : en dessous, on reste sur LIKE
+    FTS_MIN_TERM_LENGTH = 3
+    # Filtres "contient" : un terme qui prolonge le précédent ne peut que restreindre les résultats
+    REFINABLE_FILTERS = ("article", "code_sap", "description", "description_longue", "quantite_installee", "situation")
+    # Réglages appliqués une seule fois à chaque nouvelle connexion
+    CONNECTION_PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA cache_size=-65536",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY",
+    )
+    # Nombre de totaux (par jeu de filtres) gardés en cache
+    COUNT_CACHE_SIZE = 32
+    # Pages de résultats gardées en cache (au-delà de RESULT_CACHE_MAX_ROWS lignes, une page n'est pas gardée)
+    RESULT_CACHE_SIZE = 64
+    RESULT_CACHE_MAX_ROWS = 5000
+    # Lignes complètes gardées en cache par id
+    ROW_CACHE_SIZE = 10000
+    # Mode "total estimé" : taille de l'échantillon et part minimale de lignes retenues
+    ESTIMATE_SAMPLE_SIZE = 20000
+    ESTIMATE_MIN_RATIO = 0.2
+    # Correspondance colonnes Excel -> colonnes de la table pieces (import et export)
+    EXCEL_COLUMNS = (
+        ("Article", "article"), ("code SAP", "code_sap"), ("Description", "description"),
+        ("Description longue", "description_longue"), ("Unité de mesure principale", "unite_mesure"),
+        ("Statut de l'article", "statut_article"), ("Quantité installée", "quantite_installee"),
+        ("Situation", "situation"), ("Image", "image_path"),
+    )
+    # Taille des lots executemany lors de l'import Excel
+    MIGRATION_CHUNK_SIZE = 5000
+    # Taille des lots lus par le curseur lors d'un export
+    EXPORT_CHUNK_SIZE = 2000
+    # Colonnes lues pour une pièce, dans un ordre fixe (indépendant de l'ordre des ALTER TABLE)
+    PIECE_COLUMNS = (
+        "id", "article", "code_sap", "description", "description_longue", "unite_mesure", "statut_article",
+        "quantite_installee", "situation", "image_path", "date_creation", "date_modification",
+        "has_image", "image_size", "image_mtime",
+    )
+    # Nombre de lignes vérifiées par lot lors de la réconciliation des images
+    IMAGE_RECONCILE_CHUNK_SIZE = 500
+    # Champs saisis d'une pièce (ordre des tuples piece_data), suivis dans l'historique
+    HISTORY_FIELDS = PIECE_COLUMNS[1:10]
+    # Champs modifiables en masse (l'article et l'image restent propres à chaque pièce)
+    BULK_FIELDS = ("code_sap", "description", "description_longue", "unite_mesure", "statut_article", "quantite_installee", "situation")
+    # Champs facultatifs : une valeur vide est enregistrée NULL (filtre "vide" et audits des champs manquants sur index partiels)
+    NULLABLE_FIELDS = ("code_sap", "description", "description_longue", "unite_mesure", "statut_article", "quantite_installee", "situation",
+                       "image_path")
+    # Entrées de l'ancien journal texte : "[date] Action: ... | ID: ... | détails" puis "    champ : 'avant' -> 'après'"
+    LEGACY_HISTORY_ENTRY = re.compile(r"^\[(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)\] Action: (.*)$")
+    LEGACY_HISTORY_CHANGE = re.compile(r"^    (.+?) : '(.*)' -> '(.*)'$")
+    LEGACY_HISTORY_VALUE = re.compile(r"^    (.+?) : '(.*)'$")
+    # Version du schéma (PRAGMA user_version) : une base à jour ne repasse pas par create_schema à l'ouverture
+    SCHEMA_VERSION = 4
+    FTS_TRIGGERS = ("pieces_fts_ai", "pieces_fts_ad", "pieces_fts_au")
+
+    def __init__(self, db_path="ocp_pieces.db"):
+        self.db_path = db_path
+        self.fts_enabled = False
+        # Une connexion longue durée par thread (thread Tk, workers de l'executor)
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        # Cache LRU des totaux : signature -> [filtres, total, estimé]
+        self.count_cache = OrderedDict()
+        # Cache LRU des pages : (signature, pagination, tri, colonnes) -> (filtres, lignes)
+        self.result_cache = OrderedDict()
+        # Cache LRU des lignes : id -> ligne complète
+        self.row_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.cache_generation = 0
+        # COMMIT dont les mises à jour de cache ne sont pas encore appliquées
+        self.pending_commits = 0
+        self.cache_counters = {name: [0, 0] for name in ("totaux", "resultats", "lignes")}
+        # Connexion de surveillance : PRAGMA data_version change à chaque COMMIT d'une autre connexion
+        # (autres postes, ligne de commande, service) -> caches vidés à la consultation suivante
+        self.watch_conn = None
+        self.seen_data_version = None
+        self.version_lock = threading.Lock()
+        # Bilan du dernier import Excel (lignes, durée, débit ou erreur)
+        self.migration_stats = None
+        self.init_database()
+
+    def get_connection(self):
+        """Connexion du thread courant, ouverte et réglée au premier appel"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            # isolation_level=None : les transactions sont pilotées par transaction()
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            for pragma in self.CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            conn.create_function("parse_quantite", 1, parse_quantite, deterministic=True)
+            self.local.conn = conn
+            self.local.depth = 0
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Transaction d'écriture ré-entrante (les niveaux imbriqués deviennent des SAVEPOINT)"""
+        conn = self.get_connection()
+        depth = self.local.depth
+        if depth == 0:
+            self.local.on_commit = []
+        mark = len(self.local.on_commit)
+        conn.execute("BEGIN IMMEDIATE" if depth == 0 else f"SAVEPOINT sp{depth}")
+        self.local.depth = depth + 1
+        try:
+            yield conn
+        except BaseException:
+            # Les mises à jour de cache du niveau annulé sont abandonnées avec lui
+            del self.local.on_commit[mark:]
+            if depth == 0:
+                conn.execute("ROLLBACK")
+            else:
+                conn.execute(f"ROLLBACK TO sp{depth}")
+                conn.execute(f"RELEASE sp{depth}")
+            raise
+        else:
+            if depth == 0:
+                # Entre le COMMIT et ses mises à jour de cache, une lecture verrait déjà les nouvelles données :
+                # rien n'entre en cache pendant ce temps, et ce qui a été lu avant n'y entre pas non plus
+                with self.cache_lock:
+                    self.cache_generation += 1
+                    self.pending_commits += 1
+                try:
+                    external = self.commit(conn)
+                    for callback in self.local.on_commit:
+                        callback()
+                    if external:
+                        self.invalidate_caches()
+                finally:
+                    with self.cache_lock:
+                        self.pending_commits -= 1
+                        self.cache_generation += 1
+            else:
+                conn.execute(f"RELEASE sp{depth}")
+        finally:
+            self.local.depth = depth
+
+    def commit(self, conn):
+        """COMMIT de la transaction de conn ; vrai si une autre connexion a aussi écrit (caches à vider)"""
+        # Notre propre COMMIT change data_version de la connexion de surveillance : la valeur vue est
+        # relevée juste après, sans laisser passer une écriture d'une autre connexion :
+        # - avant le COMMIT, la surveillance doit encore donner la valeur vue (sinon écriture antérieure) ;
+        # - la connexion qui écrit ne voit pas ses propres COMMIT : sa valeur ne change qu'après celui d'une autre.
+        with self.version_lock:
+            external = self.data_version() != self.seen_data_version
+            before = conn.execute("PRAGMA data_version").fetchone()[0]
+            conn.execute("COMMIT")
+            self.seen_data_version = self.data_version()
+            external = external or conn.execute("PRAGMA data_version").fetchone()[0] != before
+        return external
+
+    def data_version(self):
+        """PRAGMA data_version de la connexion de surveillance (appelé sous version_lock)"""
+        if self.watch_conn is None:
+            self.watch_conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            self.watch_conn.execute("PRAGMA busy_timeout=5000")
+        return self.watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def check_data_version(self):
+        """Vider les caches si la base a été modifiée par une autre connexion depuis la dernière consultation"""
+        with self.version_lock:
+            version = self.data_version()
+            if version == self.seen_data_version:
+                return
+            self.seen_data_version = version
+            self.invalidate_caches()
+
+    def after_commit(self, callback):
+        """Différer une mise à jour des caches jusqu'au COMMIT de la transaction courante"""
+        self.local.on_commit.append(callback)
+
+    def close(self):
+        """Fermer toutes les connexions ouvertes (arrêt de l'application)"""
+        with self.connections_lock:
+            connections, self.connections = self.connections, []
+            self.local = threading.local()
+        with self.version_lock:
+            if self.watch_conn is not None:
+                self.watch_conn.close()
+                self.watch_conn = None
+        for conn in connections:
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def init_database(self):
+        """Initialiser la base de données (DDL uniquement si le schéma n'est pas à jour)"""
+        conn = self.get_connection()
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= self.SCHEMA_VERSION:
+            # Simple lecture, sans verrou d'écriture : index plein texte et triggers toujours en place ?
+            names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE name LIKE 'pieces_fts%'")}
+            if names.issuperset(("pieces_fts",) + self.FTS_TRIGGERS):
+                self.fts_enabled = True
+                return
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            self.create_schema(cursor)
+            self.upgrade_schema(cursor, version)
+            cursor.execute(f"PRAGMA user_version = {max(version, self.SCHEMA_VERSION)}")
+
+    def upgrade_schema(self, cursor, version):
+        """Étapes de mise à niveau des données, chacune exécutée une seule fois (version = PRAGMA user_version lu)"""
+        if version < 2:
+            # Quantité numérique calculée pour les lignes existantes ; index reconstruit en une passe après coup
+            cursor.execute("DROP INDEX IF EXISTS idx_quantite_num")
+            cursor.execute("UPDATE pieces SET quantite_num = parse_quantite(quantite_installee) "
+                           "WHERE quantite_installee IS NOT NULL AND quantite_installee <> ''")
+            cursor.execute("CREATE INDEX idx_quantite_num ON pieces(quantite_num)")
+        empty = lambda field: f"(trim({field}) = '' OR lower(trim({field})) = 'nan')"
+        if version < 3:
+            # Valeurs vides ramenées à NULL en une passe (chaque ligne concernée n'est réindexée qu'une fois)
+            assignments = ", ".join(f"{field} = CASE WHEN {empty(field)} THEN NULL ELSE {field} END" for field in self.NULLABLE_FIELDS)
+            cursor.execute(f"UPDATE pieces SET {assignments} WHERE {' OR '.join(empty(field) for field in self.NULLABLE_FIELDS)}")
+        elif version < 4:
+            # Image vide ('' écrit par les anciennes réparations) : NULL comme les autres champs facultatifs
+            cursor.execute(f"UPDATE pieces SET image_path = NULL WHERE {empty('image_path')}")
+
+    def create_schema(self, cursor):
+        """Créer les tables, index et l'index plein texte"""
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pieces (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article TEXT NOT NULL,
+                code_sap TEXT,
+                description TEXT,
+                description_longue TEXT,
+                unite_mesure TEXT,
+                statut_article TEXT,
+                quantite_installee TEXT,
+                situation TEXT,
+                image_path TEXT,
+                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Ajout dynamique des colonnes si elles n'existent pas déjà
+        try:
+            cursor.execute("ALTER TABLE pieces ADD COLUMN quantite_installee TEXT")
+        except sqlite3.OperationalError:
+            pass
+        try:
+            cursor.execute("ALTER TABLE pieces ADD COLUMN situation TEXT")
+        except sqlite3.OperationalError:
+            pass
+        # Présence de l'image mémorisée en base : l'affichage d'une page ne touche plus au disque
+        try:
+            cursor.execute("ALTER TABLE pieces ADD COLUMN has_image INTEGER NOT NULL DEFAULT 0")
+            # Valeur provisoire, corrigée par reconcile_image_flags()
+            cursor.execute("UPDATE pieces SET has_image = 1 WHERE image_path IS NOT NULL AND image_path <> ''")
+        except sqlite3.OperationalError:
+            pass
+        try:
+            cursor.execute("ALTER TABLE pieces ADD COLUMN image_size INTEGER")
+        except sqlite3.OperationalError:
+            pass
+        try:
+            cursor.execute("ALTER TABLE pieces ADD COLUMN image_mtime REAL")
+        except sqlite3.OperationalError:
+            pass
+        # Copie numérique de quantite_installee (parse_quantite) : filtres par plage sur index
+        try:
+            cursor.execute("ALTER TABLE pieces ADD COLUMN quantite_num REAL")
+        except sqlite3.OperationalError:
+            pass
+        # Index pour optimiser les recherches
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article ON pieces(article)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_code_sap ON pieces(code_sap)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_description ON pieces(description)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_statut ON pieces(statut_article)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_quantite_num ON pieces(quantite_num)')
+        # Index partiels des champs manquants : ne contiennent que les pièces concernées, déjà triées par article
+        for field in self.NULLABLE_FIELDS:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_missing_{field} ON pieces(article) WHERE {field} IS NULL')
+        # Compteur de références des images du magasin (une image peut servir à plusieurs pièces)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_image_path ON pieces(image_path)')
+        # Journal des actions : une ligne par évènement, changements champ par champ en JSON
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                piece_id INTEGER,
+                action TEXT NOT NULL,
+                timestamp TEXT NOT NULL DEFAULT (datetime('now', 'localtime')),
+                details TEXT,
+                changes TEXT
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_piece ON history(piece_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_action ON history(action)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_timestamp ON history(timestamp)')
+        self.fts_enabled = self.init_fts(cursor)
+
+    def init_fts(self, cursor):
+        """Créer l'index plein texte FTS5 et ses triggers de synchronisation"""
+        cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'pieces_fts%' AND type IN ('table', 'trigger')")
+        existing = {row[0] for row in cursor.fetchall()}
+        try:
+            if "pieces_fts" not in existing:
+                # Table "external content" : le texte reste dans pieces, FTS5 ne stocke que l'index
+                cursor.execute('''
+                    CREATE VIRTUAL TABLE pieces_fts USING fts5(
+                        article, code_sap, description, description_longue, situation,
+                        content='pieces', content_rowid='id', tokenize='trigram'
+                    )
+                ''')
+            else:
+                cursor.execute("SELECT 1 FROM pieces_fts LIMIT 0")
+        except sqlite3.OperationalError:
+            # SQLite compilé sans FTS5 (ou trop ancien pour trigram) : les triggers
+            # empêcheraient toute écriture, on les retire et on reste sur LIKE
+            for name in self.FTS_TRIGGERS:
+                cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+            return False
+        cols = ", ".join(self.FTS_COLUMNS)
+        new_cols = ", ".join(f"new.{c}" for c in self.FTS_COLUMNS)
+        old_cols = ", ".join(f"old.{c}" for c in self.FTS_COLUMNS)
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS pieces_fts_ai AFTER INSERT ON pieces BEGIN
+                INSERT INTO pieces_fts(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS pieces_fts_ad AFTER DELETE ON pieces BEGIN
+                INSERT INTO pieces_fts(pieces_fts, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS pieces_fts_au AFTER UPDATE OF {cols} ON pieces BEGIN
+                INSERT INTO pieces_fts(pieces_fts, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+                INSERT INTO pieces_fts(rowid, {cols}) VALUES (new.id, {new_cols});
+            END
+        ''')
+        # Index créé à l'instant, ou triggers absents (base modifiée sans FTS5) : reconstruction complète
+        if not existing.issuperset(("pieces_fts",) + self.FTS_TRIGGERS):
+            cursor.execute("INSERT INTO pieces_fts(pieces_fts) VALUES('rebuild')")
+        return True
+
+    def read_excel_rows(self, excel_path):
+        """Lire le classeur en flux -> (générateur de lignes prêtes à insérer, nombre estimé de lignes)"""
+        def to_text(value):
+            if value is None or (isinstance(value, float) and math.isnan(value)):
+                return ""
+            # Les codes numériques lus comme flottants ne doivent pas finir en "12345.0"
+            if isinstance(value, float) and value.is_integer():
+                return str(int(value))
+            return str(value)
+        if os.path.splitext(excel_path)[1].lower() in (".xlsx", ".xlsm"):
+            # Lecture en mode read_only : le classeur n'est jamais chargé en entier
+            from openpyxl import load_workbook
+            workbook = load_workbook(excel_path, read_only=True, data_only=True)
+            try:
+                max_row = workbook.active.max_row
+            finally:
+                workbook.close()
+            total = max_row - 1 if max_row else None
+            def generate():
+                # Classeur ouvert par le générateur lui-même : fermé même s'il n'est parcouru qu'en partie,
+                # et jamais laissé ouvert s'il n'est pas parcouru du tout
+                workbook = load_workbook(excel_path, read_only=True, data_only=True)
+                try:
+                    rows = workbook.active.iter_rows(values_only=True)
+                    header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+                    # Correspondance des colonnes calculée une seule fois
+                    positions = [header.index(name) if name in header else None for name, _ in self.EXCEL_COLUMNS]
+                    for row in rows:
+                        if not any(v is not None for v in row):
+                            continue
+                        yield tuple(to_text(row[i]) if i is not None and i < len(row) else "" for i in positions)
+                finally:
+                    workbook.close()
+            return generate(), total
+        # Anciens formats (.xls, .csv) : pandas, importé seulement pour eux (long à charger)
+        import pandas as pd
+        if excel_path.lower().endswith(".csv"):
+            chunks = pd.read_csv(excel_path, dtype=str, keep_default_na=False, chunksize=self.MIGRATION_CHUNK_SIZE)
+            total = None
+        else:
+            df = pd.read_excel(excel_path, dtype=str)
+            chunks, total = [df], len(df)
+        def generate():
+            try:
+                for df in chunks:
+                    df = df.reindex(columns=[name for name, _ in self.EXCEL_COLUMNS]).fillna("")
+                    yield from df.itertuples(index=False, name=None)
+            finally:
+                # Lecteur CSV par morceaux : fichier fermé même si la lecture s'arrête en route
+                if hasattr(chunks, "close"):
+                    chunks.close()
+        return generate(), total
+
+    def migrate_from_excel(self, excel_path, progress_callback=None):
+        """Migrer les données depuis Excel vers SQLite (insertion par lots dans une seule transaction)"""
+        if not os.path.exists(excel_path):
+            return False
+        self.migration_stats = None
+        columns = ", ".join([column for _, column in self.EXCEL_COLUMNS] + ["quantite_num"])
+        placeholders = ", ".join("?" * (len(self.EXCEL_COLUMNS) + 1))
+        excel_fields = [column for _, column in self.EXCEL_COLUMNS]
+        quantite = excel_fields.index("quantite_installee")
+        rows = None
+        try:
+            # Base déjà remplie : le fichier n'est même pas ouvert (revérifié dans la transaction)
+            if self.get_connection().execute("SELECT EXISTS (SELECT 1 FROM pieces)").fetchone()[0]:
+                return True
+            start = time.perf_counter()
+            rows, total = self.read_excel_rows(excel_path)
+            done = 0
+            with self.transaction() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT COUNT(*) FROM pieces")
+                count = cursor.fetchone()[0]
+                if count != 0:
+                    return True
+                # Index et triggers FTS retirés pendant le chargement, recréés en une passe à la fin
+                cursor.execute("SELECT name, type FROM sqlite_master WHERE tbl_name='pieces' AND sql IS NOT NULL AND type IN ('index', 'trigger')")
+                for name, kind in cursor.fetchall():
+                    cursor.execute(f"DROP {kind.upper()} {name}")
+                while True:
+                    chunk = list(itertools.islice(rows, self.MIGRATION_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    cursor.executemany(f"INSERT INTO pieces ({columns}) VALUES ({placeholders})",
+                                       [self.canonical_values(row, excel_fields) + (parse_quantite(row[quantite]),) for row in chunk])
+                    done += len(chunk)
+                    if progress_callback:
+                        progress_callback(done, total, done / max(time.perf_counter() - start, 1e-6))
+                self.create_schema(cursor)
+                self.after_commit(self.invalidate_caches)
+            elapsed = time.perf_counter() - start
+            self.migration_stats = {'rows': done, 'seconds': elapsed, 'rows_per_second': done / max(elapsed, 1e-6)}
+            return True
+        except Exception as e:
+            self.migration_stats = {'error': str(e)}
+            return False
+        finally:
+            # Générateur interrompu (erreur, base remplie entre-temps) : classeur fermé
+            if rows is not None:
+                rows.close()
+
+    def build_filters_clause(self, filters):
+        """Construire la jointure FTS, la clause WHERE et les paramètres d'une recherche"""
+        conditions, params, match_terms = [], [], []
+        def add_text_filter(column, value):
+            # Les filtres libres passent par l'index trigram (même sémantique "contient" que LIKE)
+            if self.fts_enabled and column in self.FTS_COLUMNS and len(value) >= self.FTS_MIN_TERM_LENGTH:
+                escaped = value.replace('"', '""')
+                match_terms.append(f'{column} : "{escaped}"')
+            else:
+                conditions.append(f"pieces.{column} LIKE ?")
+                params.append(f"%{value}%")
+        if filters:
+            if filters.get('article'):
+                add_text_filter("article", filters['article'])
+            # Ajout du filtre pour code SAP vide
+            if filters.get('code_sap_empty'):
+                conditions.append("pieces.code_sap IS NULL")
+            elif filters.get('code_sap'):
+                add_text_filter("code_sap", filters['code_sap'])
+            if filters.get('description'):
+                add_text_filter("description", filters['description'])
+            if filters.get('description_longue'):
+                add_text_filter("description_longue", filters['description_longue'])
+            if filters.get('statut') and filters['statut'] != 'Tous':
+                conditions.append("pieces.statut_article LIKE ?")
+                params.append(f"%{filters['statut']}%")
+            if filters.get('unite') and filters['unite'] != 'Tous':
+                conditions.append("pieces.unite_mesure LIKE ?")
+                params.append(f"%{filters['unite']}%")
+            if filters.get('quantite_installee'):
+                conditions.append("pieces.quantite_installee LIKE ?")
+                params.append(f"%{filters['quantite_installee']}%")
+            # Audit : pièces dont le champ est vide (index partiel idx_missing_<champ>)
+            if filters.get('missing'):
+                if filters['missing'] not in self.NULLABLE_FIELDS:
+                    raise ValueError(f"Champ inconnu : {filters['missing']}")
+                conditions.append(f"pieces.{filters['missing']} IS NULL")
+            # Plage de quantité (bornes incluses) : parcours de idx_quantite_num
+            if filters.get('quantite_min') is not None:
+                conditions.append("pieces.quantite_num >= ?")
+                params.append(filters['quantite_min'])
+            if filters.get('quantite_max') is not None:
+                conditions.append("pieces.quantite_num <= ?")
+                params.append(filters['quantite_max'])
+            if filters.get('situation'):
+                add_text_filter("situation", filters['situation'])
+        join = ""
+        if match_terms:
+            join = " JOIN pieces_fts ON pieces_fts.rowid = pieces.id"
+            conditions.insert(0, "pieces_fts MATCH ?")
+            params.insert(0, " AND ".join(match_terms))
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return join, where, params, bool(match_terms)
+
+    def filters_signature(self, filters):
+        """Clé de cache normalisée d'un jeu de filtres (valeurs vides ignorées ; une borne à 0 est conservée)"""
+        return tuple(sorted((k, v) for k, v in (filters or {}).items() if not (v is None or v is False or v in ("", "Tous"))))
+
+    def count_pieces(self, filters=None, estimate=False):
+        """Nombre de pièces retenues par les filtres -> (total, estimé)"""
+        self.check_data_version()
+        signature = self.filters_signature(filters)
+        with self.cache_lock:
+            entry = self.count_cache.get(signature)
+            if entry is not None and (estimate or not entry[2]):
+                self.count_cache.move_to_end(signature)
+                self.cache_counters["totaux"][0] += 1
+                return entry[1], entry[2]
+            self.cache_counters["totaux"][1] += 1
+            generation = self.cache_generation
+        cursor = self.get_connection().cursor()
+        join, where, params, ranked = self.build_filters_clause(filters)
+        total, estimated = None, False
+        if estimate and where and not ranked:
+            total = self.estimate_count(cursor, where, params)
+            estimated = total is not None
+        if total is None:
+            cursor.execute(f"SELECT COUNT(*) FROM pieces{join}{where}", params)
+            total = cursor.fetchone()[0]
+        with self.cache_lock:
+            # Une écriture a eu lieu pendant le comptage : le résultat n'est pas mis en cache
+            if self.cacheable(generation):
+                self.count_cache[signature] = [dict(filters or {}), total, estimated]
+                self.count_cache.move_to_end(signature)
+                while len(self.count_cache) > self.COUNT_CACHE_SIZE:
+                    self.count_cache.popitem(last=False)
+        return total, estimated
+
+    def estimate_count(self, cursor, where, params):
+        """Extrapoler le total d'un filtre large à partir de plages d'id réparties dans la table"""
+        total_rows = self.count_pieces()[0]
+        if total_rows <= self.ESTIMATE_SAMPLE_SIZE:
+            return None
+        cursor.execute("SELECT MIN(id), MAX(id) FROM pieces")
+        low, high = cursor.fetchone()
+        windows = 10
+        width = self.ESTIMATE_SAMPLE_SIZE // windows
+        step = max((high - low) // windows, width)
+        bounds = []
+        for i in range(windows):
+            bounds += [low + i * step, low + i * step + width - 1]
+        condition = where[len(" WHERE "):]
+        cursor.execute(
+            f"SELECT COUNT(*), SUM(CASE WHEN {condition} THEN 1 ELSE 0 END) FROM pieces WHERE "
+            + " OR ".join(["id BETWEEN ? AND ?"] * windows),
+            params + bounds
+        )
+        sampled, matched = cursor.fetchone()
+        # Filtre étroit : l'extrapolation serait trop imprécise, on compte exactement
+        if not sampled or matched < sampled * self.ESTIMATE_MIN_RATIO:
+            return None
+        return round(total_rows * matched / sampled)
+
+    def matching_signatures(self, cursor, piece_id):
+        """Signatures des totaux et pages en cache dont les filtres retiennent la pièce piece_id"""
+        with self.cache_lock:
+            entries = {signature: entry[0] for signature, entry in self.count_cache.items()}
+            entries.update((key[0], entry[0]) for key, entry in self.result_cache.items())
+        matched = set()
+        for signature, filters in entries.items():
+            join, where, params, _ = self.build_filters_clause(filters)
+            where = f"{where} AND pieces.id = ?" if where else " WHERE pieces.id = ?"
+            cursor.execute(f"SELECT 1 FROM pieces{join}{where}", params + [piece_id])
+            if cursor.fetchone():
+                matched.add(signature)
+        return matched
+
+    def apply_write(self, piece_id, before=frozenset(), after=frozenset()):
+        """Répercuter l'écriture d'une pièce sur les caches (signatures qui la retenaient avant / après)"""
+        with self.cache_lock:
+            self.cache_generation += 1
+            # Totaux : -1 / +1 seulement là où l'appartenance de la pièce a changé
+            for signatures, delta in ((before - after, -1), (after - before, 1)):
+                for signature in signatures:
+                    if signature in self.count_cache:
+                        self.count_cache[signature][1] += delta
+            self.row_cache.pop(piece_id, None)
+            # Pages : seules celles qui contenaient ou contiendront la pièce sont périmées.
+            # Le score FTS dépend de statistiques globales : les pages par pertinence le sont toutes.
+            touched = before | after
+            for key in [key for key in self.result_cache if key[0] in touched or key[2] == "pertinence"]:
+                del self.result_cache[key]
+
+    def forget_rows(self, piece_ids):
+        """Oublier des lignes modifiées sans effet sur les filtres (indicateurs d'image)"""
+        with self.cache_lock:
+            self.cache_generation += 1
+            for piece_id in piece_ids:
+                self.row_cache.pop(piece_id, None)
+            for key in [key for key in self.result_cache if key[3] is None]:
+                del self.result_cache[key]
+
+    def invalidate_caches(self):
+        """Vider tous les caches (écritures en masse)"""
+        with self.cache_lock:
+            self.cache_generation += 1
+            self.count_cache.clear()
+            self.result_cache.clear()
+            self.row_cache.clear()
+
+    def cacheable(self, generation):
+        """Vrai si un résultat lu depuis generation peut entrer en cache (appelé sous cache_lock)"""
+        return generation == self.cache_generation and not self.pending_commits
+
+    def cache_stats(self):
+        """Succès, échecs, taille et capacité de chaque cache"""
+        capacities = {"totaux": (self.count_cache, self.COUNT_CACHE_SIZE),
+                      "resultats": (self.result_cache, self.RESULT_CACHE_SIZE),
+                      "lignes": (self.row_cache, self.ROW_CACHE_SIZE)}
+        with self.cache_lock:
+            return {name: {'hits': hits, 'misses': misses, 'size': len(capacities[name][0]), 'capacity': capacities[name][1]}
+                    for name, (hits, misses) in self.cache_counters.items()}
+
+    def search_pieces(self, filters=None, limit=1000, offset=0, sort="article", after=None, before=None, from_end=False,
+                      estimate_count=False, columns=None, cancel_event=None):
+        """Rechercher des pièces avec filtres (sort="pertinence" pour classer par score FTS)"""
+        self.check_data_version()
+        signature = self.filters_signature(filters)
+        key = (signature, (limit, offset, after, before, from_end), sort, tuple(columns) if columns else None)
+        with self.cache_lock:
+            entry = self.result_cache.get(key)
+            if entry is not None:
+                self.result_cache.move_to_end(key)
+                self.cache_counters["resultats"][0] += 1
+            else:
+                self.cache_counters["resultats"][1] += 1
+            generation = self.cache_generation
+        if entry is not None:
+            # Le total reste lu dans son propre cache (ajusté à chaque écriture)
+            return list(entry[1]), self.count_pieces(filters, estimate=estimate_count)[0]
+        with self.cancellable(cancel_event):
+            results, total_count = self.run_search_query(filters, limit, offset, sort, after, before, from_end, estimate_count, columns)
+        if len(results) <= self.RESULT_CACHE_MAX_ROWS:
+            with self.cache_lock:
+                # Une écriture a eu lieu pendant la lecture : la page n'est pas mise en cache
+                if self.cacheable(generation):
+                    self.result_cache[key] = (dict(filters or {}), tuple(results))
+                    while len(self.result_cache) > self.RESULT_CACHE_SIZE:
+                        self.result_cache.popitem(last=False)
+        return results, total_count
+
+    @contextmanager
+    def cancellable(self, cancel_event):
+        """Rendre les requêtes du bloc interruptibles par cancel_event"""
+        if cancel_event is None:
+            yield
+            return
+        # SQLite interroge le gestionnaire de progression et abandonne la requête
+        # (sqlite3.OperationalError "interrupted") dès que l'évènement est levé
+        conn = self.get_connection()
+        conn.set_progress_handler(cancel_event.is_set, 5000)
+        try:
+            yield
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    @classmethod
+    def filters_narrow(cls, previous, current):
+        """Vrai si les filtres current ne peuvent que restreindre les résultats de previous"""
+        for key, value in previous.items():
+            if key not in current:
+                return False
+            if key in cls.REFINABLE_FILTERS:
+                if value.lower() not in current[key].lower():
+                    return False
+                # Terme court (LIKE) prolongé jusqu'à l'index FTS : les deux ne replient pas la casse pareil
+                if key in cls.FTS_COLUMNS and len(value) < cls.FTS_MIN_TERM_LENGTH <= len(current[key]):
+                    return False
+            elif key == 'quantite_min':
+                if current[key] < value:
+                    return False
+            elif key == 'quantite_max':
+                if current[key] > value:
+                    return False
+            elif current[key] != value:
+                return False
+        return True
+
+    def refine_pieces(self, filters, candidate_ids, cancel_event=None):
+        """Appliquer les filtres à un ensemble d'ids déjà connu -> [(id, article)] triés par article"""
+        # Même correspondance que la recherche complète (index FTS si le terme y passe) : LIKE ne replie
+        # la casse que pour l'ASCII et donnerait, sur un texte accentué, un autre résultat que l'index trigram
+        join, where, params, _ = self.build_filters_clause(filters)
+        candidates = "pieces.id IN (SELECT value FROM json_each(?))"
+        where = f"{where} AND {candidates}" if where else f" WHERE {candidates}"
+        with self.cancellable(cancel_event):
+            cursor = self.get_connection().cursor()
+            cursor.execute(f"SELECT pieces.id, pieces.article FROM pieces{join}{where} ORDER BY pieces.article, pieces.id",
+                           params + [json.dumps(list(candidate_ids))])
+            return cursor.fetchall()
+
+    def run_search_query(self, filters, limit, offset, sort, after, before, from_end, estimate_count, columns=None):
+        """Exécuter le comptage et la lecture de la page demandée"""
+        # Le total ne dépend que des filtres : il vient du cache tant qu'on ne fait que paginer
+        total_count = self.count_pieces(filters, estimate=estimate_count)[0]
+        cursor = self.get_connection().cursor()
+        join, where, params, ranked = self.build_filters_clause(filters)
+        if ranked and sort == "pertinence":
+            cursor.execute(f"SELECT {self.piece_columns(columns)} FROM pieces{join}{where} ORDER BY pieces_fts.rank, pieces.article LIMIT ? OFFSET ?", params + [limit, offset])
+            return cursor.fetchall(), total_count
+        # Pagination par clé (article, id) : idx_article contient implicitement le rowid,
+        # la reprise après/avant une clé est donc une recherche dans l'index, sans OFFSET
+        descending = before is not None or from_end
+        if after is not None or before is not None:
+            seek = "(pieces.article, pieces.id) " + (">" if after is not None else "<") + " (?, ?)"
+            where = f"{where} AND {seek}" if where else f" WHERE {seek}"
+            params = params + list(after if after is not None else before)
+            offset = 0
+        elif from_end:
+            offset = 0
+        order = "pieces.article DESC, pieces.id DESC" if descending else "pieces.article, pieces.id"
+        cursor.execute(f"SELECT {self.piece_columns(columns)} FROM pieces{join}{where} ORDER BY {order} LIMIT ? OFFSET ?", params + [limit, offset])
+        results = cursor.fetchall()
+        if descending:
+            results.reverse()
+        return results, total_count
+
+    def piece_columns(self, columns=None):
+        """Liste SQL des colonnes d'une pièce (préfixées pour les jointures FTS)"""
+        return ", ".join(f"pieces.{c}" for c in (columns or self.PIECE_COLUMNS))
+
+    def image_state(self, image_path):
+        """État d'un fichier image -> (présent, taille, date de modification)"""
+        if not image_path:
+            return 0, None, None
+        try:
+            st = os.stat(image_path)
+        except OSError:
+            return 0, None, None
+        return 1, st.st_size, st.st_mtime
+
+    def get_piece_by_id(self, piece_id):
+        """Obtenir une pièce par ID"""
+        return self.get_pieces_by_ids([piece_id]).get(piece_id)
+
+    def get_pieces_by_ids(self, piece_ids):
+        """Obtenir plusieurs pièces par ID -> {id: ligne}"""
+        self.check_data_version()
+        pieces, missing = {}, []
+        with self.cache_lock:
+            for piece_id in piece_ids:
+                row = self.row_cache.get(piece_id)
+                if row is not None:
+                    self.row_cache.move_to_end(piece_id)
+                    pieces[piece_id] = row
+                else:
+                    missing.append(piece_id)
+            self.cache_counters["lignes"][0] += len(pieces)
+            self.cache_counters["lignes"][1] += len(missing)
+            generation = self.cache_generation
+        if not missing:
+            return pieces
+        cursor = self.get_connection().cursor()
+        fetched = []
+        # Lots de 500 pour rester sous la limite de paramètres SQLite
+        for start in range(0, len(missing), 500):
+            chunk = missing[start:start + 500]
+            cursor.execute(f"SELECT {self.piece_columns()} FROM pieces WHERE id IN ({', '.join('?' * len(chunk))})", chunk)
+            fetched += cursor.fetchall()
+        pieces.update((row[0], row) for row in fetched)
+        with self.cache_lock:
+            if self.cacheable(generation):
+                self.row_cache.update((row[0], row) for row in fetched)
+                while len(self.row_cache) > self.ROW_CACHE_SIZE:
+                    self.row_cache.popitem(last=False)
+        return pieces
+
+    def canonical_values(self, values, fields):
+        """Valeurs (dans l'ordre de fields) dont les champs facultatifs vides sont ramenés à None"""
+        return tuple(empty_to_none(value) if field in self.NULLABLE_FIELDS else value for value, field in zip(values, fields))
+
+    def insert_piece(self, piece_data, action="Création"):
+        """Insérer une nouvelle pièce (journalisée sous action, sauf si action est None)"""
+        piece_data = self.canonical_values(piece_data, self.HISTORY_FIELDS)
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO pieces
+                (article, code_sap, description, description_longue, unite_mesure, statut_article, quantite_installee, situation, image_path,
+                 has_image, image_size, image_mtime, quantite_num)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', tuple(piece_data) + self.image_state(piece_data[8]) + (parse_quantite(piece_data[6]),))
+            piece_id = cursor.lastrowid
+            if action:
+                self.record_history(cursor, action, piece_id, f"Article: {piece_data[0]}",
+                                    self.piece_changes(None, piece_data))
+            added = self.matching_signatures(cursor, piece_id)
+            self.after_commit(lambda: self.apply_write(piece_id, after=added))
+        return piece_id
+
+    def update_piece(self, piece_id, piece_data, action="Modification"):
+        """Mettre à jour une pièce (journalisée sous action, sauf si action est None)"""
+        piece_data = self.canonical_values(piece_data, self.HISTORY_FIELDS)
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            if action:
+                cursor.execute(f"SELECT {', '.join(self.HISTORY_FIELDS)} FROM pieces WHERE id = ?", (piece_id,))
+                old_data = cursor.fetchone()
+            before = self.matching_signatures(cursor, piece_id)
+            cursor.execute('''
+                UPDATE pieces
+                SET article=?, code_sap=?, description=?, description_longue=?,
+                    unite_mesure=?, statut_article=?, quantite_installee=?, situation=?, image_path=?,
+                    has_image=?, image_size=?, image_mtime=?, quantite_num=?, date_modification=CURRENT_TIMESTAMP
+                WHERE id=?
+            ''', tuple(piece_data) + self.image_state(piece_data[8]) + (parse_quantite(piece_data[6]), piece_id))
+            if action:
+                self.record_history(cursor, action, piece_id, f"Article: {piece_data[0]}",
+                                    self.piece_changes(old_data, piece_data))
+            after = self.matching_signatures(cursor, piece_id)
+            self.after_commit(lambda: self.apply_write(piece_id, before, after))
+
+    def reconcile_image_flags(self, cancel_event=None):
+        """Resynchroniser has_image / taille / date avec le disque, par lots (renvoie le nombre de lignes corrigées)"""
+        changed, last_id = 0, 0
+        # Les stat() partent en parallèle : sur un partage réseau, c'est la latence qui domine
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            while cancel_event is None or not cancel_event.is_set():
+                cursor = self.get_connection().cursor()
+                cursor.execute(
+                    "SELECT id, image_path, has_image, image_size, image_mtime FROM pieces WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self.IMAGE_RECONCILE_CHUNK_SIZE)
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                states = pool.map(self.image_state, [row[1] for row in rows])
+                updates = [state + (row[0],) for row, state in zip(rows, states) if state != tuple(row[2:5])]
+                if updates:
+                    with self.transaction() as conn:
+                        conn.executemany("UPDATE pieces SET has_image=?, image_size=?, image_mtime=? WHERE id=?", updates)
+                        self.after_commit(lambda ids=[update[-1] for update in updates]: self.forget_rows(ids))
+                    changed += len(updates)
+        return changed
+
+    def delete_piece(self, piece_id, action="Suppression"):
+        """Supprimer une pièce (journalisée sous action, sauf si action est None)"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            if action:
+                cursor.execute(f"SELECT {', '.join(self.HISTORY_FIELDS)} FROM pieces WHERE id = ?", (piece_id,))
+                old_data = cursor.fetchone()
+                if old_data:
+                    self.record_history(cursor, action, piece_id, f"Article: {old_data[0]}",
+                                        self.piece_changes(old_data, None))
+            removed = self.matching_signatures(cursor, piece_id)
+            cursor.execute("DELETE FROM pieces WHERE id = ?", (piece_id,))
+            self.after_commit(lambda: self.apply_write(piece_id, before=removed))
+
+    def bulk_update(self, changes, piece_ids=None, filters=None, action="Modification groupée"):
+        """Appliquer changes {champ: valeur} aux pièces piece_ids (ou à toutes celles retenues par filters)
+        en une transaction : un UPDATE et un lot d'historique -> nombre de pièces modifiées"""
+        fields = [field for field in changes if field in self.BULK_FIELDS]
+        if not fields:
+            return 0
+        values = list(self.canonical_values([changes[field] for field in fields], fields))
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            # Ensemble cible dans une table temporaire (en mémoire, propre à la connexion)
+            cursor.execute("CREATE TEMP TABLE IF NOT EXISTS bulk_ids (id INTEGER PRIMARY KEY)")
+            cursor.execute("DELETE FROM bulk_ids")
+            if piece_ids is not None:
+                cursor.executemany("INSERT OR IGNORE INTO bulk_ids (id) VALUES (?)", ((piece_id,) for piece_id in piece_ids))
+            else:
+                join, where, params, _ = self.build_filters_clause(filters)
+                cursor.execute(f"INSERT INTO bulk_ids (id) SELECT pieces.id FROM pieces{join}{where}", params)
+            # Seules les pièces dont une valeur change sont modifiées et journalisées
+            differs = " OR ".join(f"{field} IS NOT ?" for field in fields)
+            target = f"id IN (SELECT id FROM bulk_ids) AND ({differs})"
+            diff = ", ".join(f"'{field}', json_array({field}, ?)" for field in fields)
+            cursor.execute(
+                f"INSERT INTO history (piece_id, action, details, changes) "
+                f"SELECT id, ?, 'Article: ' || article, json_object({diff}) FROM pieces WHERE {target}",
+                [action] + values + values
+            )
+            assignments = [f"{field} = ?" for field in fields]
+            assigned = list(values)
+            if "quantite_installee" in fields:
+                assignments.append("quantite_num = ?")
+                assigned.append(parse_quantite(changes["quantite_installee"]))
+            cursor.execute(f"UPDATE pieces SET {', '.join(assignments)}, date_modification = CURRENT_TIMESTAMP WHERE {target}",
+                           assigned + values)
+            updated = cursor.rowcount
+            cursor.execute("DELETE FROM bulk_ids")
+            self.after_commit(self.invalidate_caches)
+        return updated
+
+    def find_pieces_by_codes(self, codes):
+        """Pièces dont l'article ou le code SAP figure dans codes (recherche par index) -> {code: [(id, image_path)]}"""
+        matches = {}
+        codes = list(set(codes))
+        cursor = self.get_connection().cursor()
+        for column in ("article", "code_sap"):
+            # Lots de 500 pour rester sous la limite de paramètres SQLite
+            for start in range(0, len(codes), 500):
+                chunk = codes[start:start + 500]
+                cursor.execute(f"SELECT {column}, id, image_path FROM pieces WHERE {column} IN ({', '.join('?' * len(chunk))})", chunk)
+                for code, piece_id, image_path in cursor.fetchall():
+                    matches.setdefault(code, []).append((piece_id, image_path))
+        return matches
+
+    def set_image_paths(self, assignments, action="Import image"):
+        """Associer leurs images à plusieurs pièces en une transaction : [(id, ancien chemin, nouveau chemin)]"""
+        rows = [(path,) + self.image_state(path) + (piece_id,) for piece_id, _, path in assignments]
+        events = [(piece_id, action, f"Fichier: {os.path.basename(path)}", json.dumps({"image_path": [old or None, path]}, ensure_ascii=False))
+                  for piece_id, old, path in assignments]
+        with self.transaction() as conn:
+            conn.executemany(
+                "UPDATE pieces SET image_path=?, has_image=?, image_size=?, image_mtime=?, date_modification=CURRENT_TIMESTAMP WHERE id=?",
+                rows
+            )
+            conn.executemany("INSERT INTO history (piece_id, action, details, changes) VALUES (?, ?, ?, ?)", events)
+            # Import en lot ; le filtre "image manquante" dépend du chemin : totaux et pages périmés
+            self.after_commit(self.invalidate_caches)
+        return len(assignments)
+
+    def image_references(self, paths):
+        """Nombre de pièces qui utilisent chaque chemin d'image -> {chemin: nombre}"""
+        cursor = self.get_connection().cursor()
+        counts = {}
+        for path in set(paths):
+            cursor.execute("SELECT COUNT(*) FROM pieces WHERE image_path = ?", (path,))
+            counts[path] = cursor.fetchone()[0]
+        return counts
+
+    def image_paths_in_use(self):
+        """Chemins d'image référencés et nombre de pièces pour chacun (parcours de idx_image_path)"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT image_path, COUNT(*) FROM pieces WHERE image_path IS NOT NULL AND image_path <> '' GROUP BY image_path")
+        return dict(cursor.fetchall())
+
+    def clear_image_paths(self, paths, action="Image manquante"):
+        """Retirer des pièces les chemins d'image donnés (fichiers disparus), en une transaction -> nombre de pièces"""
+        paths = list(set(paths))
+        cleared = 0
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            # Lots de 500 pour rester sous la limite de paramètres SQLite
+            for start in range(0, len(paths), 500):
+                chunk = paths[start:start + 500]
+                placeholders = ", ".join("?" * len(chunk))
+                cursor.execute(
+                    f"INSERT INTO history (piece_id, action, details, changes) "
+                    f"SELECT id, ?, 'Article: ' || article, json_object('image_path', json_array(image_path, NULL)) "
+                    f"FROM pieces WHERE image_path IN ({placeholders})",
+                    [action] + chunk
+                )
+                cursor.execute(
+                    f"UPDATE pieces SET image_path = NULL, has_image = 0, image_size = NULL, image_mtime = NULL, "
+                    f"date_modification = CURRENT_TIMESTAMP WHERE image_path IN ({placeholders})",
+                    chunk
+                )
+                cleared += cursor.rowcount
+            self.after_commit(self.invalidate_caches)
+        return cleared
+
+    def rename_image_paths(self, mapping):
+        """Remplacer des chemins d'image (ancien -> nouveau) sur toutes les pièces qui les utilisent"""
+        with self.transaction() as conn:
+            conn.executemany("UPDATE pieces SET image_path = ? WHERE image_path = ?", [(new, old) for old, new in mapping.items()])
+            self.after_commit(self.invalidate_caches)
+
+    def piece_changes(self, old_data, new_data):
+        """Différences champ par champ entre deux états d'une pièce -> {champ: [avant, après]}"""
+        changes = {}
+        for i, field in enumerate(self.HISTORY_FIELDS):
+            old_value = old_data[i] if old_data else None
+            new_value = new_data[i] if new_data else None
+            # Création / suppression : seuls les champs renseignés sont gardés
+            if old_data is None or new_data is None:
+                if (old_value if new_data is None else new_value) in (None, ""):
+                    continue
+            elif str(old_value or "") == str(new_value or ""):
+                continue
+            changes[field] = [old_value, new_value]
+        return changes
+
+    def record_history(self, cursor, action, piece_id=None, details=None, changes=None):
+        """Ajouter un évènement au journal, dans la transaction du curseur fourni"""
+        cursor.execute(
+            "INSERT INTO history (piece_id, action, details, changes) VALUES (?, ?, ?, ?)",
+            (piece_id, action, details, json.dumps(changes, ensure_ascii=False) if changes else None)
+        )
+
+    def log_event(self, action, piece_id=None, details=None):
+        """Journaliser une action qui ne modifie pas la table pieces"""
+        with self.transaction() as conn:
+            self.record_history(conn.cursor(), action, piece_id, details)
+
+    def search_history(self, piece_id=None, action=None, date_from=None, date_to=None, before_id=None, after_id=None, limit=200):
+        """Évènements du journal, du plus récent au plus ancien -> [(id, piece_id, action, timestamp, details, changes)]"""
+        conditions, params = [], []
+        if piece_id is not None:
+            conditions.append("piece_id = ?")
+            params.append(piece_id)
+        if action:
+            conditions.append("action = ?")
+            params.append(action)
+        # Dates au format AAAA-MM-JJ, bornes incluses
+        if date_from:
+            conditions.append("timestamp >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("timestamp < date(?, '+1 day')")
+            params.append(date_to)
+        # Pagination par clé sur l'id (croissant avec la date) : une page coûte le même prix partout
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        order = "ASC" if after_id is not None else "DESC"
+        cursor = self.get_connection().cursor()
+        cursor.execute(f"SELECT id, piece_id, action, timestamp, details, changes FROM history{where} ORDER BY id {order} LIMIT ?",
+                       params + [limit])
+        rows = cursor.fetchall()
+        if after_id is not None:
+            rows.reverse()
+        return rows
+
+    def history_actions(self):
+        """Types d'action présents dans le journal"""
+        cursor = self.get_connection().cursor()
+        cursor.execute("SELECT DISTINCT action FROM history ORDER BY action")
+        return [row[0] for row in cursor.fetchall()]
+
+    def import_history_file(self, path):
+        """Importer l'ancien journal texte dans la table history (lecture ligne à ligne) -> nombre d'évènements"""
+        def parse(lines):
+            entry = None
+            for line in lines:
+                line = line.rstrip("\n")
+                match = self.LEGACY_HISTORY_ENTRY.match(line)
+                if match:
+                    if entry:
+                        yield entry
+                    timestamp, rest = match.groups()
+                    parts = rest.split(" | ")
+                    action, piece_id, details = parts[0], None, []
+                    for part in parts[1:]:
+                        if part.startswith("ID: ") and part[4:].isdigit() and piece_id is None:
+                            piece_id = int(part[4:])
+                        else:
+                            details.append(part)
+                    entry = [piece_id, action, timestamp, " | ".join(details) or None, {}]
+                    continue
+                if entry is None or not line.strip():
+                    continue
+                change = self.LEGACY_HISTORY_CHANGE.match(line)
+                value = None if change else self.LEGACY_HISTORY_VALUE.match(line)
+                if change:
+                    entry[4][change.group(1)] = [change.group(2), change.group(3)]
+                elif value:
+                    # Création : valeurs après ; suppression : valeurs avant
+                    deleted = entry[1] == "Suppression"
+                    entry[4][value.group(1)] = [value.group(2), None] if deleted else [None, value.group(2)]
+                else:
+                    # Suite d'une valeur sur plusieurs lignes : conservée dans les détails
+                    entry[3] = f"{entry[3]}\n{line.strip()}" if entry[3] else line.strip()
+            if entry:
+                yield entry
+        imported = 0
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            rows = ((piece_id, action, timestamp, details, json.dumps(changes, ensure_ascii=False) if changes else None)
+                    for piece_id, action, timestamp, details, changes in parse(f))
+            with self.transaction() as conn:
+                while True:
+                    chunk = list(itertools.islice(rows, self.MIGRATION_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    conn.executemany("INSERT INTO history (piece_id, action, timestamp, details, changes) VALUES (?, ?, ?, ?, ?)", chunk)
+                    imported += len(chunk)
+        return imported
+
+    def iter_pieces(self, filters=None, columns=None, chunk_size=None):
+        """Parcourir les pièces filtrées par lots, sans charger tout le résultat en mémoire"""
+        join, where, params, _ = self.build_filters_clause(filters)
+        selected = self.piece_columns(columns)
+        cursor = self.get_connection().cursor()
+        cursor.execute(f"SELECT {selected} FROM pieces{join}{where}", params)
+        while True:
+            rows = cursor.fetchmany(chunk_size or self.EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield rows
+
+    def pieces_after(self, filters=None, after_id=0, limit=None, columns=None):
+        """Lot de pièces filtrées d'id supérieur à after_id, par id croissant (parcours par lots sans curseur ouvert)"""
+        join, where, params, _ = self.build_filters_clause(filters)
+        where = f"{where} AND pieces.id > ?" if where else " WHERE pieces.id > ?"
+        cursor = self.get_connection().cursor()
+        cursor.execute(f"SELECT {self.piece_columns(columns)} FROM pieces{join}{where} ORDER BY pieces.id LIMIT ?",
+                       params + [after_id, limit or self.EXPORT_CHUNK_SIZE])
+        return cursor.fetchall()
+
+    def export_to_excel(self, output_path, filters=None, progress_callback=None, cancel_event=None):
+        """Exporter vers Excel en flux (renvoie le nombre de lignes, None si l'export est annulé)"""
+        total = self.count_pieces(filters)[0]
+        # Classeur write_only : les lignes partent sur disque au fil de l'eau
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Sheet1")
+        sheet.append([name for name, _ in self.EXCEL_COLUMNS])
+        done = 0
+        for rows in self.iter_pieces(filters, columns=[column for _, column in self.EXCEL_COLUMNS]):
+            if cancel_event is not None and cancel_event.is_set():
+                sheet.close()
+                return None
+            for row in rows:
+                sheet.append(row)
+            done += len(rows)
+            if progress_callback:
+                progress_callback(done, total)
+        workbook.save(output_path)
+        return done
+
+class ImageStore:
+    """Magasin d'images adressé par contenu : une image identique n'est stockée qu'une fois,
+    et n'est supprimée que lorsque plus aucune pièce ne la référence"""
+    # Âge minimal (s) d'un fichier non référencé avant d'être signalé comme orphelin
+    ORPHAN_MIN_AGE = 300
+
+    def __init__(self, folder, db_manager):
+        self.folder = folder
+        self.db_manager = db_manager
+        os.makedirs(folder, exist_ok=True)
+
+    def store(self, source, max_size=(800, 600)):
+        """Ajouter une image (redimensionnée) au magasin -> chemin à enregistrer dans pieces.image_path"""
+        return store_image_file(source, self.folder, max_size)
+
+    def contains(self, path):
+        """Vrai si path désigne un fichier du dossier d'images (magasin ou ancien format)"""
+        return bool(path) and os.path.abspath(path).startswith(os.path.join(os.path.abspath(self.folder), ""))
+
+    def stored_path(self, path):
+        """Forme enregistrée en base d'un fichier du dossier : relative à celui-ci, comme les chemins rendus par store().
+        Les compteurs de références comparent les chemins tels quels : un même fichier n'a qu'une seule forme."""
+        return os.path.join(self.folder, os.path.relpath(os.path.abspath(path), os.path.abspath(self.folder)))
+
+    def release(self, paths):
+        """Supprimer les images du magasin qui ne sont plus référencées (à appeler après l'écriture en base)"""
+        paths = [self.stored_path(path) for path in paths if self.contains(path)]
+        # Forme absolue comptée aussi : anciens enregistrements pas encore corrigés par migrate_legacy()
+        references = self.db_manager.image_references(paths + [os.path.abspath(path) for path in paths])
+        removed = 0
+        for path in set(paths):
+            count = references[path] + references[os.path.abspath(path)]
+            if count == 0 and os.path.exists(path):
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def migrate_legacy(self):
+        """Ranger les images de l'ancien format (piece_<id>_<date>.ext à la racine) dans le magasin
+        et ramener à la forme de stored_path() les chemins du dossier écrits autrement (absolus...)
+        -> nombre de fichiers rangés et de chemins corrigés"""
+        # Corrections de chemins d'abord : executemany les applique dans l'ordre, avant le rangement
+        mapping = {}
+        for path in self.db_manager.image_paths_in_use():
+            if self.contains(path) and path != self.stored_path(path):
+                mapping[path] = self.stored_path(path)
+        legacy = [entry.path for entry in os.scandir(self.folder)
+                  if entry.is_file() and not entry.name.startswith(".")
+                  and os.path.splitext(entry.name)[1].lower() in (".jpg", ".jpeg", ".png")]
+        if not legacy and not mapping:
+            return 0
+        # Copie dans le magasin, puis chemins mis à jour en une transaction, puis suppression des
+        # originaux : une interruption ne laisse jamais de pièce pointer vers un fichier absent
+        for path in legacy:
+            digest = file_sha256(path)
+            ext = os.path.splitext(path)[1].lower()
+            os.makedirs(os.path.join(self.folder, digest[:2]), exist_ok=True)
+            final = os.path.join(self.folder, digest[:2], digest + ext)
+            if not os.path.exists(final):
+                shutil.copy2(path, final)
+            mapping[path] = final
+        self.db_manager.rename_image_paths(mapping)
+        for path in legacy:
+            os.remove(path)
+        return len(mapping)
+
+    def scan(self, state_path=None, cancel_event=None):
+        """Comparer le dossier et la colonne image_path -> rapport (fichiers orphelins, références sans fichier),
+        ou None si cancel_event a été levé"""
+        start = time.perf_counter()
+        # Parcours du dossier sur un thread d'appoint pendant la lecture des références en base, faite sur le
+        # thread appelant : sa connexion existe déjà (une connexion ouverte par un thread jetable resterait ouverte)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            walked = pool.submit(self.walk, state_path, cancel_event)
+            references = self.db_manager.image_paths_in_use()
+            walked = walked.result()
+        if walked is None:
+            return None
+        files, rescanned = walked
+        # Chemins construits de la même façon (os.path.join sur le dossier) : normpath suffit à les comparer
+        normalize = lambda path: os.path.normcase(os.path.normpath(self.stored_path(path) if self.contains(path) else path))
+        prefix = os.path.join(normalize(self.folder), "")
+        known = {normalize(path): path for path in files}
+        referenced = {normalize(path): path for path in references}
+        # Un fichier très récent peut appartenir à une écriture en cours : il n'est pas encore orphelin
+        recent = time.time() - self.ORPHAN_MIN_AGE
+        orphans = [path for key, path in known.items() if key not in referenced and files[path] < recent]
+        dangling = [(path, references[path]) for key, path in referenced.items()
+                    if (key not in known if key.startswith(prefix) else not os.path.exists(path))]
+        return {'files': len(files), 'references': len(references), 'orphans': sorted(orphans),
+                'dangling': sorted(dangling), 'rescanned': rescanned, 'seconds': time.perf_counter() - start}
+
+    def walk(self, state_path=None, cancel_event=None):
+        """Fichiers du dossier {chemin: mtime} et nombre de dossiers relus.
+        Un dossier dont la date de modification n'a pas changé reprend la liste mémorisée dans state_path."""
+        state = {}
+        if state_path and os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                state = {}
+        new_state, files, rescanned = {}, {}, 0
+        pending = [self.folder]
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                return None
+            folder = pending.pop()
+            mtime = os.stat(folder).st_mtime
+            entry = state.get(folder)
+            if entry is None or entry['mtime'] != mtime:
+                # Ajout ou suppression dans ce dossier : seul celui-ci est relu
+                rescanned += 1
+                entry = {'mtime': mtime, 'dirs': [], 'files': {}}
+                with os.scandir(folder) as entries:
+                    for item in entries:
+                        if item.is_dir():
+                            entry['dirs'].append(item.path)
+                        elif item.is_file():
+                            entry['files'][item.name] = item.stat().st_mtime
+            new_state[folder] = entry
+            pending += entry['dirs']
+            files.update((os.path.join(folder, name), file_mtime) for name, file_mtime in entry['files'].items())
+        if state_path and (rescanned or new_state.keys() != state.keys()):
+            tmp = state_path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(new_state, f)
+            os.replace(tmp, state_path)
+        return files, rescanned
+
+    def repair(self, report):
+        """Supprimer les fichiers orphelins et retirer les références sans fichier -> (fichiers supprimés, pièces corrigées)"""
+        # release() revérifie en base qu'aucune pièce n'utilise le fichier
+        removed = self.release(report['orphans'])
+        missing = [path for path, _ in report['dangling'] if not os.path.exists(path)]
+        return removed, self.db_manager.clear_image_paths(missing)
@@ -1,17 +1,26 @@
+import time
+# Origine des temps du rapport de démarrage (avant le chargement des autres modules)
+STARTUP_START = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import sqlite3
-import pandas as pd
-from PIL import Image, ImageTk
 import os
-import shutil
 from datetime import datetime
 import threading
-from concurrent.futures import ThreadPoolExecutor
+import logging
+from logging.handlers import RotatingFileHandler
+import platform
+import getpass
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import multiprocessing
 import math
 import hashlib
-import stat
+import json
+import tempfile
 import sys
+import argparse
+from database_ocp import DatabaseManager, ImageStore, store_image_file, parse_quantite
 
 def resource_path(relative_path):
     # Trouve le bon chemin pour PyInstaller ou pour le script normal
@@ -19,220 +28,378 @@ def resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-class DatabaseManager:
-    """Gestionnaire de base de données SQLite"""
-    def __init__(self, db_path="ocp_pieces.db"):
-        self.db_path = db_path
-        self.init_database()
-
-    def init_database(self):
-        """Initialiser la base de données"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pieces (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                article TEXT NOT NULL,
-                code_sap TEXT,
-                description TEXT,
-                description_longue TEXT,
-                unite_mesure TEXT,
-                statut_article TEXT,
-                quantite_installee TEXT,
-                situation TEXT,
-                image_path TEXT,
-                date_creation TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                date_modification TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        # Ajout dynamique des colonnes si elles n'existent pas déjà
-        try:
-            cursor.execute("ALTER TABLE pieces ADD COLUMN quantite_installee TEXT")
-        except sqlite3.OperationalError:
-            pass
-        try:
-            cursor.execute("ALTER TABLE pieces ADD COLUMN situation TEXT")
-        except sqlite3.OperationalError:
-            pass
-        # Index pour optimiser les recherches
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article ON pieces(article)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_code_sap ON pieces(code_sap)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_description ON pieces(description)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_statut ON pieces(statut_article)')
-        conn.commit()
-        conn.close()
-
-    def migrate_from_excel(self, excel_path):
-        """Migrer les données depuis Excel vers SQLite"""
-        if not os.path.exists(excel_path):
-            return False
-        try:
-            df = pd.read_excel(excel_path)
-            conn = sqlite3.connect(self.db_path)
-            # Remplacer les NaN par des chaînes vides pour tous les champs
-            df = df.fillna("")
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM pieces")
-            count = cursor.fetchone()[0]
-            if count == 0:
-                for _, row in df.iterrows():
-                    cursor.execute('''
-                        INSERT INTO pieces
-                        (article, code_sap, description, description_longue, unite_mesure, statut_article, quantite_installee, situation, image_path)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        str(row.get("Article", "")),
-                        str(row.get("code SAP", "")),
-                        str(row.get("Description", "")),
-                        str(row.get("Description longue", "")),
-                        str(row.get("Unité de mesure principale", "")),
-                        str(row.get("Statut de l'article", "")),
-                        str(row.get("Quantité installée", "")),
-                        str(row.get("Situation", "")),
-                        str(row.get("Image", ""))
-                    ))
-                conn.commit()
-                print(f"Migration terminée: {len(df)} enregistrements importés")
-            conn.close()
-            return True
-        except Exception as e:
-            print(f"Erreur migration: {e}")
-            return False
+class ThumbnailCache:
+    """Cache des miniatures : fichiers sur disque (clé = empreinte du contenu) et PhotoImage en mémoire"""
+    # Tailles prédéfinies (largeur, hauteur maximales)
+    SIZES = {"petite": (120, 90), "moyenne": (320, 240), "grande": (550, 450)}
+    # Empreintes gardées en mémoire (LRU)
+    DIGEST_ITEMS = 4096
+
+    def __init__(self, folder, max_bytes=200 * 1024 * 1024, memory_items=64):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        # (chemin, taille, mtime, taille prédéfinie) -> PhotoImage, manipulé uniquement depuis le thread Tk
+        self.photos = OrderedDict()
+        # (chemin, taille, mtime) -> empreinte : évite de relire le fichier source à chaque ouverture (LRU, workers)
+        self.digests = OrderedDict()
+        self.disk_usage = None
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def content_digest(self, path):
+        """Empreinte SHA-1 du contenu d'une image (mémorisée tant que le fichier ne change pas)"""
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime)
+        with self.lock:
+            digest = self.digests.get(key)
+            if digest is not None:
+                self.digests.move_to_end(key)
+                return digest
+        sha = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+        with self.lock:
+            self.digests[key] = digest
+            while len(self.digests) > self.DIGEST_ITEMS:
+                self.digests.popitem(last=False)
+        return digest
+
+    def thumbnail_path(self, path, preset):
+        """Miniature sur disque, générée au premier appel (à exécuter hors du thread Tk)"""
+        width, height = self.SIZES[preset]
+        thumb = os.path.join(self.folder, f"{self.content_digest(path)}_{width}x{height}.png")
+        if os.path.exists(thumb):
+            os.utime(thumb)  # Date d'accès pour l'éviction LRU
+            return thumb
+        # PIL n'est chargé qu'à la première miniature à générer
+        from PIL import Image
+        with Image.open(path) as img:
+            # draft() fait décoder les JPEG directement à échelle réduite
+            img.draft('RGB', (width, height))
+            if img.mode not in ('RGB', 'RGBA', 'L', 'P'):
+                img = img.convert('RGB')
+            img.thumbnail((width, height), Image.Resampling.LANCZOS)
+            # Fichier temporaire propre à cet appel (deux workers peuvent générer la même miniature) ;
+            # suffixe .tmp : ignoré par l'éviction, qui ne compte que les .png
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.folder)
+            os.close(fd)
+            try:
+                img.save(tmp, "PNG")
+                os.replace(tmp, thumb)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        with self.lock:
+            if self.disk_usage is not None:
+                self.disk_usage += os.path.getsize(thumb)
+        self.evict()
+        return thumb
+
+    def evict(self):
+        """Supprimer les miniatures les moins récemment utilisées au-delà de la taille maximale"""
+        with self.lock:
+            if self.disk_usage is not None and self.disk_usage <= self.max_bytes:
+                return
+            entries = []
+            for entry in os.scandir(self.folder):
+                if entry.is_file() and entry.name.endswith(".png"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+            self.disk_usage = sum(size for _, size, _ in entries)
+            entries.sort()
+            # On redescend à 90 % pour ne pas relancer l'éviction à chaque nouvelle miniature
+            for _, size, path in entries:
+                if self.disk_usage <= self.max_bytes * 0.9:
+                    break
+                try:
+                    os.remove(path)
+                    self.disk_usage -= size
+                except OSError:
+                    pass
+
+    def cached_photo(self, key):
+        """PhotoImage déjà chargée pour cette clé, ou None"""
+        photo = self.photos.get(key)
+        if photo is not None:
+            self.photos.move_to_end(key)
+        return photo
+
+    def load_photo(self, key, thumb):
+        """Charger une miniature (PNG lu nativement par Tk) et la garder dans le cache mémoire"""
+        photo = tk.PhotoImage(file=thumb)
+        self.photos[key] = photo
+        while len(self.photos) > self.memory_items:
+            self.photos.popitem(last=False)
+        return photo
+
+class VirtualTreeview:
+    """Défilement virtuel d'un ttk.Treeview : seules les lignes visibles sont matérialisées"""
+    def __init__(self, tree, scrollbar, fetch_rows, format_row, cache_size=5000):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_rows = fetch_rows      # liste d'ids -> {id: ligne}
+        self.format_row = format_row      # (ligne, index) -> (valeurs, tags)
+        self.cache_size = cache_size
+        self.ids = []                     # ids de toutes les lignes de la page, dans l'ordre
+        self.rows = OrderedDict()         # cache LRU des lignes déjà lues
+        self.first = 0
+        self.visible = int(tree.cget("height"))
+        self.height = None
+        self.row_height = None
+        self.heading_height = 0
+        self.slots = []                   # items du Treeview réutilisés d'un rendu à l'autre
+        self.slot_content = {}
+        self.selected_ids = set()
+        self.syncing = False
+        self.extend_selection = False     # clic avec Ctrl/Maj : la sélection hors écran est conservée
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.bind("<<TreeviewSelect>>", self.on_tree_select)
+        tree.bind("<ButtonPress-1>", self.on_click, add="+")
+        tree.bind("<Configure>", self.on_resize)
+        tree.bind("<MouseWheel>", lambda e: self.scroll_by(-3 if e.delta > 0 else 3))
+        tree.bind("<Button-4>", lambda e: self.scroll_by(-3))
+        tree.bind("<Button-5>", lambda e: self.scroll_by(3))
+        tree.bind("<Up>", lambda e: self.move_focus(-1))
+        tree.bind("<Down>", lambda e: self.move_focus(1))
+        tree.bind("<Prior>", lambda e: self.move_focus(-self.visible))
+        tree.bind("<Next>", lambda e: self.move_focus(self.visible))
+
+    def set_data(self, ids, rows, keep_position=False):
+        """Remplacer le contenu (ids de la page + premières lignes déjà lues)"""
+        self.ids = list(ids)
+        self.rows = OrderedDict(rows)
+        self.selected_ids &= set(self.ids)
+        if not keep_position:
+            self.first = 0
+        self.render()
+
+    def visible_ids(self):
+        return self.ids[self.first:self.first + self.visible]
+
+    def render(self):
+        self.first = max(0, min(self.first, len(self.ids) - self.visible))
+        wanted = self.visible_ids()
+        # Lecture paresseuse : la fenêtre visible plus une fenêtre de marge de chaque côté
+        missing = [pid for pid in self.ids[max(0, self.first - self.visible):self.first + 2 * self.visible] if pid not in self.rows]
+        if missing:
+            self.rows.update(self.fetch_rows(missing))
+            while len(self.rows) > self.cache_size:
+                self.rows.popitem(last=False)
+        while len(self.slots) < len(wanted):
+            self.slots.append(self.tree.insert("", tk.END))
+        while len(self.slots) > len(wanted):
+            iid = self.slots.pop()
+            self.slot_content.pop(iid, None)
+            self.tree.delete(iid)
+        self.syncing = True
+        # Mise à jour différentielle : on ne touche qu'aux items dont le contenu change
+        for offset, (iid, piece_id) in enumerate(zip(self.slots, wanted)):
+            content = self.format_row(self.rows.get(piece_id), self.first + offset)
+            if self.slot_content.get(iid) != content:
+                self.tree.item(iid, values=content[0], tags=content[1])
+                self.slot_content[iid] = content
+        selection = tuple(iid for iid, piece_id in zip(self.slots, wanted) if piece_id in self.selected_ids)
+        if selection != self.tree.selection():
+            self.tree.selection_set(selection)
+        # Les <<TreeviewSelect>> issus de ce rendu sont traités avant les tâches idle
+        self.tree.after_idle(self.end_sync)
+        total = max(len(self.ids), 1)
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + self.visible) / total))
+        if self.row_height is None and self.slots:
+            self.tree.after_idle(self.update_visible)
+
+    def end_sync(self):
+        self.syncing = False
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.ids) - self.visible))
+        shift = first - self.first
+        if not shift:
+            return
+        # Petit défilement : les items qui sortent de l'écran sont recyclés à l'autre bout,
+        # les autres gardent leur contenu et ne sont pas redessinés
+        if abs(shift) < len(self.slots):
+            if shift > 0:
+                moved, self.slots = self.slots[:shift], self.slots[shift:]
+                self.slots += moved
+                for iid in moved:
+                    self.tree.move(iid, "", "end")
+            else:
+                moved, self.slots = self.slots[shift:], self.slots[:shift]
+                self.slots = moved + self.slots
+                for iid in reversed(moved):
+                    self.tree.move(iid, "", 0)
+        self.first = first
+        self.render()
+
+    def scroll_by(self, rows):
+        self.scroll_to(self.first + rows)
+
+    def on_scrollbar(self, action, *args):
+        if action == "moveto":
+            self.scroll_to(int(float(args[0]) * len(self.ids)))
+        elif action == "scroll":
+            step = int(args[0]) * (self.visible if args[1] == "pages" else 1)
+            self.scroll_by(step)
+
+    def on_resize(self, event):
+        self.height = event.height
+        self.update_visible()
+
+    def update_visible(self):
+        # Nombre de lignes affichables, mesuré sur le premier item réellement dessiné
+        if self.row_height is None and self.slots:
+            bbox = self.tree.bbox(self.slots[0])
+            if bbox:
+                self.heading_height, self.row_height = bbox[1], bbox[3]
+        if self.row_height and self.height:
+            visible = max(1, (self.height - self.heading_height) // self.row_height)
+            if visible != self.visible:
+                self.visible = visible
+                self.render()
+
+    def on_click(self, event):
+        # Appelé avant la liaison de classe du Treeview, qui émet ensuite <<TreeviewSelect>>
+        self.extend_selection = bool(event.state & (0x0001 | 0x0004))
+
+    def on_tree_select(self, event):
+        if self.syncing:
+            return
+        # Sélection utilisateur : un clic simple remplace toute la sélection, y compris hors écran ;
+        # seul Ctrl/Maj+clic l'étend (les ids sélectionnés hors écran sont alors conservés)
+        if not self.extend_selection:
+            self.selected_ids.clear()
+        self.extend_selection = False
+        selected = set(self.tree.selection())
+        for iid, piece_id in zip(self.slots, self.visible_ids()):
+            if iid in selected:
+                self.selected_ids.add(piece_id)
+            else:
+                self.selected_ids.discard(piece_id)
+        self.tree.event_generate("<<VirtualSelect>>")
+
+    def move_focus(self, step):
+        # Navigation clavier au-delà des lignes matérialisées
+        if not self.ids:
+            return "break"
+        focus = self.tree.focus()
+        index = self.first + (self.slots.index(focus) if focus in self.slots else 0)
+        index = max(0, min(index + step, len(self.ids) - 1))
+        if index < self.first:
+            self.scroll_to(index)
+        elif index >= self.first + self.visible:
+            self.scroll_to(index - self.visible + 1)
+        self.selected_ids = {self.ids[index]}
+        self.render()
+        iid = self.slots[index - self.first]
+        self.tree.focus(iid)
+        self.tree.see(iid)
+        self.tree.event_generate("<<VirtualSelect>>")
+        return "break"
+
+class UiMetrics:
+    """Temps de réponse de l'interface (de l'action à l'affichage) et blocages de la boucle Tk"""
+    HEARTBEAT_MS = 100
+    STALL_THRESHOLD_MS = 250
+    RECENT_ACTIONS = 3
+
+    def __init__(self, root, path, max_bytes=1024 * 1024, backups=5):
+        self.root = root
+        self.on_update = None
+        self.recent = deque(maxlen=self.RECENT_ACTIONS)
+        self.stalls = 0
+        self.last_action = None
+        # Une ligne JSON par mesure ; le poste permet de regrouper les fichiers de plusieurs machines
+        self.context = {'poste': platform.node(), 'utilisateur': getpass.getuser()}
+        self.logger = logging.getLogger("ocp.metriques")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+        self.beat = time.perf_counter()
+        self.root.after(self.HEARTBEAT_MS, self.heartbeat)
+
+    def start(self, action):
+        """Début d'une action utilisateur : le jeton est rendu à finish()"""
+        self.last_action = action
+        return action, time.perf_counter()
+
+    def finish(self, token, **details):
+        """Fin d'une action : mesurée une fois l'affichage en attente traité par Tk"""
+        if token is not None:
+            self.root.after_idle(self.record, token, details)
+
+    def record(self, token, details):
+        action, start = token
+        elapsed = (time.perf_counter() - start) * 1000
+        self.recent.appendleft((action, elapsed))
+        self.write("action", action=action, ms=round(elapsed, 1), **details)
+        if self.on_update: self.on_update()
+
+    def heartbeat(self):
+        # Battement régulier : un retard important signifie que le thread Tk était occupé
+        now = time.perf_counter()
+        late = (now - self.beat) * 1000 - self.HEARTBEAT_MS
+        if late > self.STALL_THRESHOLD_MS:
+            self.stalls += 1
+            self.write("blocage", ms=round(late, 1), derniere_action=self.last_action)
+            if self.on_update: self.on_update()
+        self.beat = now
+        self.root.after(self.HEARTBEAT_MS, self.heartbeat)
+
+    def write(self, kind, **fields):
+        entry = {'date': datetime.now().isoformat(timespec="milliseconds"), 'type': kind, **self.context, **fields}
+        self.logger.info(json.dumps(entry, ensure_ascii=False))
+
+    def summary(self):
+        text = " · ".join(f"{action} {elapsed:.0f} ms" for action, elapsed in self.recent)
+        if self.stalls:
+            text += f" · {self.stalls} blocage(s)"
+        return text
 
-    def search_pieces(self, filters=None, limit=1000, offset=0):
-        """Rechercher des pièces avec filtres"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        query = "SELECT * FROM pieces WHERE 1=1"
-        params = []
-        if filters:
-            if filters.get('article'):
-                query += " AND article LIKE ?"
-                params.append(f"%{filters['article']}%")
-            # Ajout du filtre pour code SAP vide
-            if filters.get('code_sap_empty'):
-                query += " AND (code_sap IS NULL OR code_sap='' OR lower(code_sap)='nan')"
-            elif filters.get('code_sap'):
-                query += " AND code_sap LIKE ?"
-                params.append(f"%{filters['code_sap']}%")
-            if filters.get('description'):
-                query += " AND description LIKE ?"
-                params.append(f"%{filters['description']}%")
-            if filters.get('description_longue'):
-                query += " AND description_longue LIKE ?"
-                params.append(f"%{filters['description_longue']}%")
-            if filters.get('statut') and filters['statut'] != 'Tous':
-                query += " AND statut_article LIKE ?"
-                params.append(f"%{filters['statut']}%")
-            if filters.get('unite') and filters['unite'] != 'Tous':
-                query += " AND unite_mesure LIKE ?"
-                params.append(f"%{filters['unite']}%")
-            if filters.get('quantite_installee'):
-                query += " AND quantite_installee LIKE ?"
-                params.append(f"%{filters['quantite_installee']}%")
-            if filters.get('situation'):
-                query += " AND situation LIKE ?"
-                params.append(f"%{filters['situation']}%")
-        # Obtenir le nombre total d'abord
-        count_query = query.replace("SELECT *", "SELECT COUNT(*)").split(" ORDER BY")[0]
-        cursor.execute(count_query, params)
-        total_count = cursor.fetchone()[0]
-        # Ajouter le tri et la pagination pour la requête principale
-        query += " ORDER BY article LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        conn.close()
-        return results, total_count
-
-    def get_piece_by_id(self, piece_id):
-        """Obtenir une pièce par ID"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM pieces WHERE id = ?", (piece_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
-
-    def insert_piece(self, piece_data):
-        """Insérer une nouvelle pièce"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO pieces
-            (article, code_sap, description, description_longue, unite_mesure, statut_article, quantite_installee, situation, image_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', piece_data)
-        piece_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return piece_id
-
-    def update_piece(self, piece_id, piece_data):
-        """Mettre à jour une pièce"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE pieces
-            SET article=?, code_sap=?, description=?, description_longue=?,
-                unite_mesure=?, statut_article=?, quantite_installee=?, situation=?, image_path=?, date_modification=CURRENT_TIMESTAMP
-            WHERE id=?
-        ''', piece_data + (piece_id,))
-        conn.commit()
-        conn.close()
-
-    def delete_piece(self, piece_id):
-        """Supprimer une pièce"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM pieces WHERE id = ?", (piece_id,))
-        conn.commit()
-        conn.close()
-
-    def export_to_excel(self, output_path, filters=None):
-        """Exporter vers Excel"""
-        conn = sqlite3.connect(self.db_path)
-        query = "SELECT * FROM pieces WHERE 1=1"
-        params = []
-        if filters:
-            if filters.get('article'):
-                query += " AND article LIKE ?"
-                params.append(f"%{filters['article']}%")
-            if filters.get('code_sap'):
-                query += " AND code_sap LIKE ?"
-                params.append(f"%{filters['code_sap']}%")
-            if filters.get('description'):
-                query += " AND description LIKE ?"
-                params.append(f"%{filters['description']}%")
-            if filters.get('statut') and filters['statut'] != 'Tous':
-                query += " AND statut_article LIKE ?"
-                params.append(f"%{filters['statut']}%")
-            if filters.get('unite') and filters['unite'] != 'Tous':
-                query += " AND unite_mesure LIKE ?"
-                params.append(f"%{filters['unite']}%")
-            if filters.get('quantite_installee'):
-                query += " AND quantite_installee LIKE ?"
-                params.append(f"%{filters['quantite_installee']}%")
-            if filters.get('situation'):
-                query += " AND situation LIKE ?"
-                params.append(f"%{filters['situation']}%")
-        df = pd.read_sql_query(query, conn, params=params)
-        df.rename(columns={
-            'article': 'Article', 'code_sap': 'code SAP', 'description': 'Description',
-            'description_longue': 'Description longue', 'unite_mesure': 'Unité de mesure principale',
-            'statut_article': "Statut de l'article", 'quantite_installee': 'Quantité installée', 'situation': 'Situation', 'image_path': 'Image'
-        }, inplace=True)
-        df.drop(columns=['id', 'date_creation', 'date_modification'], inplace=True, errors='ignore')
-        df.to_excel(output_path, index=False)
-        conn.close()
-        return len(df)
 
 class OCPPiecesManager:
     HISTORIQUE_FILE = "historique.txt"
+    HISTORIQUE_IMPORTED_FILE = "historique_importe.txt"
+    HISTORY_PAGE_SIZE = 200
+    IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+    IMAGE_SCAN_STATE_FILE = "images_scan_state.json"
+    SCAN_REPORT_LINES = 500
+    METRICS_FILE = "metriques_ui.jsonl"
+    STARTUP_REPORT_FILE = "demarrage_ocp.json"
+    # Filtre "Champs manquants" : libellé -> champ vide recherché
+    MISSING_FIELD_CHOICES = {
+        "Aucun": None, "Code SAP": "code_sap", "Description": "description", "Description longue": "description_longue",
+        "Unité": "unite_mesure", "Statut": "statut_article", "Quantité installée": "quantite_installee", "Situation": "situation",
+        "Image": "image_path",
+    }
+    # Libellés des champs journalisés (les entrées importées portent déjà leur libellé)
+    HISTORY_LABELS = {
+        "article": "Article", "code_sap": "Code SAP", "description": "Description", "description_longue": "Description longue",
+        "unite_mesure": "Unité de mesure", "statut_article": "Statut", "quantite_installee": "Quantité installée",
+        "situation": "Situation", "image_path": "Image",
+    }
     MIGRATION_FLAG_FILE = "migration_done.flag"
     PASSWORD_FILE = "password.hash"
-    def __init__(self, root):
+    # Recherche instantanée : délai de saisie (ms) et taille maximale d'un résultat affinable
+    LIVE_SEARCH_DELAY = 40
+    REFINE_MAX_ROWS = 20000
+    # Délai (ms) après lequel le démarrage se termine même si la fenêtre n'a jamais été exposée
+    STARTUP_EXPOSE_TIMEOUT = 3000
+    def __init__(self, root, server_url=None, startup_report=False):
         self.root = root
+        # Rapport de démarrage : instants (ms depuis STARTUP_START) de chaque étape
+        self.startup_phases = OrderedDict()
+        self.startup_pending = True
+        self.password_wait = 0.0
+        self.exit_after_startup = startup_report
+        self.mark_startup("modules")
         self.root.title("Gestionnaire de Pièces OCP")
         self.root.configure(bg='#f8fafc')
 
@@ -246,67 +413,235 @@ class OCPPiecesManager:
         self.root.geometry(f"{window_width}x{window_height}")
         self.root.minsize(900, 650)
 
-        self.db_manager = DatabaseManager()
+        # Mode service : le dossier d'images local n'est pas celui du service, pas de maintenance des images
+        self.remote = bool(server_url)
+        if server_url:
+            # Mode service : la base est tenue par server_ocp, partagée entre les postes
+            from server_ocp import RemoteDatabaseManager
+            try:
+                self.db_manager = RemoteDatabaseManager(server_url)
+            except sqlite3.Error as e:
+                messagebox.showerror("Service", f"Service de base de données injoignable :\n{e}")
+                self.root.destroy()
+                return
+            self.root.title(f"Gestionnaire de Pièces OCP - {server_url}")
+        else:
+            self.db_manager = DatabaseManager()
+        self.mark_startup("base")
         self.current_page = 0
         self.page_size = 100
+        # Position de la page courante : None (début), ('after', clé), ('before', clé), ('end', None) ou ('offset', n)
+        self.page_anchor = None
+        self.page_keys = None
+        self.total_is_estimate = False
         self.total_records = 0
         self.current_piece_id = None
         self.current_image = None
         self.images_folder = "images_pieces"
         self.executor = ThreadPoolExecutor(max_workers=2)
+        # Longs travaux (vérification des images, imports, exports, modifications groupées) : executor à part,
+        # pour que recherches et miniatures ne fassent jamais la queue derrière eux
+        self.background_executor = ThreadPoolExecutor(max_workers=2)
         self.editing_mode = False
+        self.export_cancel = None
+        # Recherche en cours : numéro de génération et évènement d'annulation
+        self.query_generation = 0
+        self.query_cancel = None
+        self.loading = False
+        # Recherche instantanée : saisie différée et résultats complets de la frappe précédente
+        self.live_search_job = None
+        self.live_filters = None
+        self.refine_base = None
+        self.reconcile_cancel = threading.Event()
+        # Rafraîchissement de la fenêtre d'historique ouverte (None si fermée)
+        self.history_refresh = None
+        self.metrics = UiMetrics(self.root, self.METRICS_FILE)
 
         if not os.path.exists(self.images_folder):
             os.makedirs(self.images_folder)
+        self.thumbnails = ThumbnailCache(self.images_folder + "_miniatures")
+        self.image_store = ImageStore(self.images_folder, self.db_manager)
         self.check_and_run_migration()
         # Système de mot de passe : demander à chaque démarrage
+        password_start = time.perf_counter()
         if not self.check_password():
             self.root.destroy()
             return
+        self.password_wait = time.perf_counter() - password_start
         # Suppression de la vérification d'intégrité
         self.setup_styles()
         self.create_widgets()
+        self.metrics.on_update = self.show_metrics
         
         self.setup_keyboard_shortcuts()
         self.create_help_menu()
-        self.create_history_file_if_needed()
-
-        self.load_data()
         self.update_button_states()
+        self.mark_startup("interface")
+        # Le reste attend le premier dessin de la fenêtre : main() appelle update_idletasks() avant que la
+        # fenêtre soit affichée, un simple after_idle passerait donc avant tout dessin
+        # (fenêtre déjà affichée par la demande de mot de passe : ce sont les widgets créés qui reçoivent <Expose>)
+        self.expose_binding = self.root.bind("<Expose>", self.on_first_expose, add="+")
+        # Sécurité : fenêtre jamais exposée (démarrage réduit...), le démarrage se termine quand même
+        self.root.after(self.STARTUP_EXPOSE_TIMEOUT, self.on_first_expose)
+
+    def on_first_expose(self, event=None):
+        if self.expose_binding is None:
+            return
+        self.root.unbind("<Expose>", self.expose_binding)
+        self.expose_binding = None
+        # Les dessins déclenchés par les <Expose> en attente sont des tâches idle :
+        # finish_startup passe au tour idle suivant, une fois la fenêtre peinte
+        self.root.after_idle(self.root.after_idle, self.finish_startup)
+
+    def finish_startup(self):
+        self.mark_startup("fenetre")
+        self.load_data(action="Démarrage")
+        self.start_history_import()
+        if not self.remote:
+            self.start_image_reconciliation()
+
+    def mark_startup(self, phase):
+        self.startup_phases[phase] = round((time.perf_counter() - STARTUP_START) * 1000, 1)
+
+    def report_startup(self):
+        # Écrit après l'affichage de la première page ; l'attente du mot de passe est déduite du total
+        self.mark_startup("premiere_page")
+        report = {
+            'date': datetime.now().isoformat(timespec="seconds"),
+            'poste': platform.node(),
+            'python': platform.python_version(),
+            'phases_ms': dict(self.startup_phases),
+            'mot_de_passe_ms': round(self.password_wait * 1000, 1),
+            'total_ms': round(self.startup_phases["premiere_page"] - self.password_wait * 1000, 1),
+            # Modules lourds chargés au démarrage (doivent rester à False)
+            'modules_charges': {name: name in sys.modules for name in ("pandas", "openpyxl", "PIL")},
+        }
+        try:
+            with open(self.STARTUP_REPORT_FILE, 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"Rapport de démarrage non écrit : {e}")
+        self.metrics.write("demarrage", **report)
+        if self.exit_after_startup:
+            print(json.dumps(report, ensure_ascii=False, indent=2))
+            self.on_closing()
+
+    def start_image_reconciliation(self):
+        # Vérification des fichiers images en tâche de fond ; rafraîchit la liste si des indicateurs changent
+        future = self.background_executor.submit(self.run_image_reconciliation)
+        def poll():
+            if not future.done():
+                self.root.after(500, poll)
+                return
+            if not future.exception() and future.result():
+                self.load_data(keep_position=True)
+            if not self.reconcile_cancel.is_set():
+                self.start_image_scan(silent=True)
+        self.root.after(500, poll)
+
+    def start_image_scan(self, silent=False):
+        # Contrôle d'intégrité du dossier d'images en tâche de fond (incrémental grâce aux dates des dossiers)
+        future = self.background_executor.submit(self.image_store.scan, self.IMAGE_SCAN_STATE_FILE, self.reconcile_cancel)
+        if not silent:
+            self.update_status("Vérification des images...", "loading")
+        def poll():
+            if not future.done():
+                self.root.after(300, poll)
+                return
+            try:
+                report = future.result()
+            except Exception as e:
+                if not silent:
+                    messagebox.showerror("Erreur", f"Erreur de vérification des images: {str(e)}")
+                return
+            if report is None:
+                return
+            problems = len(report['orphans']) + len(report['dangling'])
+            if not silent:
+                self.show_image_scan_report(report)
+            elif problems:
+                self.update_status(f"{problems} anomalie(s) d'images - Maintenance > Vérifier les images", "warning")
+        self.root.after(300, poll)
+
+    def show_image_scan_report(self, report):
+        win = tk.Toplevel(self.root)
+        win.title("Vérification des images")
+        win.geometry("700x450")
+        win.transient(self.root)
+        win.grab_set()
+        frame = ttk.Frame(win, padding="15")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="Vérification des images", font=("Segoe UI", 14, "bold")).pack(anchor=tk.W)
+        ttk.Label(frame, text=(f"{report['files']} fichier(s), {report['references']} image(s) référencée(s) - "
+                               f"{report['rescanned']} dossier(s) relu(s) en {report['seconds']:.2f} s")).pack(anchor=tk.W, pady=(5, 10))
+        text = tk.Text(frame, wrap=tk.NONE, height=15, font=("Consolas", 9))
+        text.pack(fill=tk.BOTH, expand=True)
+        text.insert(tk.END, f"Fichiers orphelins (aucune pièce) : {len(report['orphans'])}\n")
+        for path in report['orphans'][:self.SCAN_REPORT_LINES]:
+            text.insert(tk.END, f"    {path}\n")
+        text.insert(tk.END, f"\nRéférences sans fichier : {len(report['dangling'])}\n")
+        for path, count in report['dangling'][:self.SCAN_REPORT_LINES]:
+            text.insert(tk.END, f"    {path} ({count} pièce(s))\n")
+        text.config(state="disabled")
 
-    def create_history_file_if_needed(self):
+        def repair():
+            if not messagebox.askyesno("Confirmation", "Supprimer les fichiers orphelins et retirer les références sans fichier ?", parent=win):
+                return
+            try:
+                removed, cleared = self.image_store.repair(report)
+            except Exception as e:
+                messagebox.showerror("Erreur", f"Erreur de réparation: {str(e)}", parent=win)
+                return
+            win.destroy()
+            self.update_status(f"{removed} fichier(s) supprimé(s), {cleared} pièce(s) corrigée(s).", "success")
+            if cleared:
+                self.load_data(keep_position=True)
+
+        buttons = ttk.Frame(frame)
+        buttons.pack(fill=tk.X, pady=(10, 0))
+        repair_btn = ttk.Button(buttons, text="Réparer", command=repair, style="Success.TButton")
+        repair_btn.pack(side=tk.LEFT)
+        if not report['orphans'] and not report['dangling']:
+            repair_btn.state(["disabled"])
+        ttk.Button(buttons, text="Fermer", command=win.destroy).pack(side=tk.RIGHT)
+
+    def run_image_reconciliation(self):
+        # Les images de l'ancien format rejoignent d'abord le magasin adressé par contenu
+        migrated = self.image_store.migrate_legacy()
+        return self.db_manager.reconcile_image_flags(self.reconcile_cancel) or migrated
+
+    def start_history_import(self):
+        # Import de l'ancien journal en tâche de fond : un gros fichier ne retarde pas la première page
         if not os.path.exists(self.HISTORIQUE_FILE):
-            with open(self.HISTORIQUE_FILE, 'w', encoding='utf-8') as f:
-                f.write("Historique des modifications\n===========================\n")
+            return
+        future = self.background_executor.submit(self.import_legacy_history)
+        def poll():
+            if not future.done():
+                self.root.after(300, poll)
+                return
+            if future.result() and self.history_refresh is not None:
+                self.history_refresh()
+        self.root.after(300, poll)
 
-    def log_history(self, action, piece_id=None, details=None, old_data=None, new_data=None):
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        entry = f"[{now}] Action: {action}"
-        if piece_id is not None:
-            entry += f" | ID: {piece_id}"
-        if details:
-            entry += f" | {details}"
-        # Ajout des détails avancés
-        if old_data is not None or new_data is not None:
-            entry += "\n"
-            if old_data is not None and new_data is not None:
-                # Modification : afficher les champs modifiés
-                for k in new_data.keys():
-                    old_val = old_data.get(k, "") if old_data else ""
-                    new_val = new_data.get(k, "") if new_data else ""
-                    if str(old_val) != str(new_val):
-                        entry += f"    {k} : '{old_val}' -> '{new_val}'\n"
-            elif new_data is not None:
-                # Création : afficher toutes les valeurs
-                for k, v in new_data.items():
-                    entry += f"    {k} : '{v}'\n"
-            elif old_data is not None:
-                # Suppression : afficher toutes les anciennes valeurs
-                for k, v in old_data.items():
-                    entry += f"    {k} : '{v}'\n"
-        entry += "\n"
-        with open(self.HISTORIQUE_FILE, 'a', encoding='utf-8') as f:
-            f.write(entry)
+    def import_legacy_history(self):
+        # Ancien journal texte : importé une fois dans la table history, puis mis de côté (exécuté sur un worker)
+        if not os.path.exists(self.HISTORIQUE_FILE):
+            return False
+        try:
+            self.db_manager.import_history_file(self.HISTORIQUE_FILE)
+            os.replace(self.HISTORIQUE_FILE, self.HISTORIQUE_IMPORTED_FILE)
+            return True
+        except Exception as e:
+            print(f"Import de l'historique impossible : {e}")
+            return False
+
+    def log_history(self, action, piece_id=None, details=None):
+        # Actions sans écriture dans pieces (les créations, modifications et suppressions
+        # sont journalisées par la base, dans leur propre transaction)
+        try:
+            self.db_manager.log_event(action, piece_id, details)
+        except sqlite3.Error as e:
+            print(f"Erreur d'écriture de l'historique : {e}")
 
     def hash_password(self, password):
         return hashlib.sha256(password.encode('utf-8')).hexdigest()
@@ -399,14 +734,43 @@ class OCPPiecesManager:
             if messagebox.askyesno("Migration",
                                  "Fichier Excel détecté. Voulez-vous migrer les données vers SQLite?\n"
                                  "Cette opération ne sera effectuée qu'une seule fois."):
-                if self.db_manager.migrate_from_excel("data.xlsx"):
-                    messagebox.showinfo("Migration", "Migration terminée avec succès!")
+                win, report_progress = self.create_progress_dialog("Migration", "Import de data.xlsx en cours...")
+                ok = self.db_manager.migrate_from_excel("data.xlsx", progress_callback=report_progress)
+                win.destroy()
+                stats = self.db_manager.migration_stats or {}
+                if ok:
+                    detail = f"\n{stats['rows']} enregistrements importés ({stats['rows_per_second']:.0f} lignes/s)" if 'rows' in stats else ""
+                    messagebox.showinfo("Migration", "Migration terminée avec succès!" + detail)
                 else:
-                    messagebox.showerror("Migration", "Erreur lors de la migration")
+                    messagebox.showerror("Migration", f"Erreur lors de la migration: {stats.get('error', '')}")
             # Après la migration, demander la création du mot de passe si besoin
             if not os.path.exists(self.PASSWORD_FILE):
                 self.set_password()
 
+    def create_progress_dialog(self, title, message, unit="lignes"):
+        # Petite fenêtre de progression utilisable avant la construction de l'interface principale
+        win = tk.Toplevel(self.root)
+        win.title(title)
+        win.geometry("380x130")
+        win.resizable(False, False)
+        win.transient(self.root)
+        frame = ttk.Frame(win, padding="15")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text=message, font=("Segoe UI", 10, "bold")).pack(anchor=tk.W)
+        bar = ttk.Progressbar(frame, mode='determinate', maximum=100)
+        bar.pack(fill=tk.X, pady=(10, 5))
+        detail = ttk.Label(frame, text="")
+        detail.pack(anchor=tk.W)
+        def report(done, total, rate):
+            if total:
+                bar['value'] = min(100, done * 100 / total)
+                detail.config(text=f"{done} / {total} {unit} - {rate:.0f} {unit}/s")
+            else:
+                detail.config(text=f"{done} {unit} - {rate:.0f} {unit}/s")
+            win.update_idletasks()
+        win.update_idletasks()
+        return win, report
+
     def setup_styles(self):
         style = ttk.Style()
         style.theme_use('clam')
@@ -474,9 +838,12 @@ class OCPPiecesManager:
         ttk.Label(title_frame, text="MIK/GE/E - 217", font=("Segoe UI", 13), foreground="#64748b", background="#f8fafc").grid(row=0, column=1, sticky="w", padx=(15, 0))
         try:
             logo_path = resource_path("OCP_Group.svg.png")
-            logo_image = Image.open(logo_path)
-            logo_image.thumbnail((200, 100), Image.Resampling.LANCZOS)
-            self.ocp_logo = ImageTk.PhotoImage(logo_image)
+            if not os.path.exists(logo_path):
+                raise FileNotFoundError(logo_path)
+            # PNG lu directement par Tk (sans PIL), réduit pour tenir dans 200 x 100
+            logo = tk.PhotoImage(file=logo_path)
+            factor = max(1, math.ceil(logo.width() / 200), math.ceil(logo.height() / 100))
+            self.ocp_logo = logo.subsample(factor) if factor > 1 else logo
             logo_label = ttk.Label(title_frame, image=self.ocp_logo, background="#f8fafc")
             logo_label.grid(row=0, column=2, sticky="e", padx=10, pady=5)
         except FileNotFoundError:
@@ -503,6 +870,15 @@ class OCPPiecesManager:
         ttk.Label(search_row1, text="Description longue:", font=("Segoe UI", 10, "bold")).grid(row=0, column=6, sticky="w")
         self.search_description_longue = ttk.Entry(search_row1, width=22, style="Modern.TEntry")
         self.search_description_longue.grid(row=0, column=7, sticky="ew", padx=(5, 12))
+        # Plage de quantité installée (bornes incluses, valeurs numériques)
+        ttk.Label(search_row1, text="Qté min / max:", font=("Segoe UI", 10, "bold")).grid(row=0, column=8, sticky="w")
+        quantite_range = ttk.Frame(search_row1)
+        quantite_range.grid(row=0, column=9, sticky="ew", padx=(5, 12))
+        self.search_quantite_min = ttk.Entry(quantite_range, width=6, style="Modern.TEntry")
+        self.search_quantite_min.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        ttk.Label(quantite_range, text="–").pack(side=tk.LEFT, padx=3)
+        self.search_quantite_max = ttk.Entry(quantite_range, width=6, style="Modern.TEntry")
+        self.search_quantite_max.pack(side=tk.LEFT, fill=tk.X, expand=True)
 
         search_row2 = ttk.Frame(search_frame)
         search_row2.grid(row=1, column=0, sticky="ew", pady=(0, 7))
@@ -526,6 +902,11 @@ class OCPPiecesManager:
         ttk.Label(search_row2, text="Situation:", font=("Segoe UI", 10, "bold")).grid(row=0, column=6, sticky="w")
         self.search_situation = ttk.Entry(search_row2, width=14, style="Modern.TEntry")
         self.search_situation.grid(row=0, column=7, sticky="ew", padx=(5, 12))
+        ttk.Label(search_row2, text="Tri:", font=("Segoe UI", 10, "bold")).grid(row=0, column=8, sticky="w")
+        self.search_tri = ttk.Combobox(search_row2, width=12, values=["Article", "Pertinence"], state="readonly", style="Modern.TCombobox")
+        self.search_tri.grid(row=0, column=9, sticky="ew", padx=(5, 12))
+        self.search_tri.set("Article")
+        self.search_tri.bind("<<ComboboxSelected>>", lambda e: self.search_data())
 
         search_buttons = ttk.Frame(search_frame)
         search_buttons.grid(row=2, column=0, sticky="ew", pady=(7, 0))
@@ -540,6 +921,17 @@ class OCPPiecesManager:
         btn_export = ttk.Button(search_buttons, text="⬇️ Exporter Excel", command=self.export_to_excel, style="Green.TButton", width=btn_width)
         btn_export.grid(row=0, column=2, sticky="ew", padx=(17, 5))
         btn_export.tooltip = self.create_tooltip(btn_export, "Exporter les résultats filtrés vers Excel")
+        self.live_search_var = tk.BooleanVar(value=True)
+        live_check = ttk.Checkbutton(search_buttons, text="Recherche instantanée", variable=self.live_search_var)
+        live_check.grid(row=0, column=3, sticky="w", padx=(17, 0))
+        live_check.tooltip = self.create_tooltip(live_check, "Actualiser les résultats pendant la saisie")
+        ttk.Label(search_buttons, text="Champs manquants:", font=("Segoe UI", 10, "bold")).grid(row=0, column=4, sticky="e", padx=(17, 5))
+        self.search_missing = ttk.Combobox(search_buttons, width=18, values=list(self.MISSING_FIELD_CHOICES), state="readonly", style="Modern.TCombobox")
+        self.search_missing.grid(row=0, column=5, sticky="w")
+        self.search_missing.set("Aucun")
+        self.search_missing.bind("<<ComboboxSelected>>", lambda e: self.search_data())
+        for widget in [self.search_article, self.search_sap, self.search_description]:
+            widget.bind("<KeyRelease>", self.schedule_live_search)
 
         data_frame = ttk.Frame(main_frame, style="Modern.TFrame")
         data_frame.grid(row=2, column=0, sticky="nsew")
@@ -604,14 +996,18 @@ class OCPPiecesManager:
         for col in columns:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=column_widths.get(col, 100), minwidth=60, stretch=True)
-        v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
         h_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL, command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
         self.tree.grid(row=0, column=0, sticky="nsew")
         v_scrollbar.grid(row=0, column=1, sticky="ns")
         h_scrollbar.grid(row=1, column=0, sticky="ew")
-        self.tree.bind("<<TreeviewSelect>>", self.on_item_select)
+        # La barre verticale pilote la liste virtuelle (et non le Treeview directement)
+        self.virtual_tree = VirtualTreeview(self.tree, v_scrollbar, self.db_manager.get_pieces_by_ids, self.format_tree_row)
+        self.tree.bind("<<VirtualSelect>>", self.on_item_select)
         self.tree.bind("<Double-1>", self.show_details_window)
+        self.tree.tag_configure('oddrow', background=self.treeview_row_colors[1])
+        self.tree.tag_configure('evenrow', background=self.treeview_row_colors[0])
 
     def create_pagination(self, parent):
         ttk.Button(parent, text="<<", command=self.first_page).pack(side=tk.LEFT, padx=2)
@@ -620,11 +1016,19 @@ class OCPPiecesManager:
         self.page_label.pack(side=tk.LEFT, padx=10)
         ttk.Button(parent, text=">", command=self.next_page).pack(side=tk.LEFT, padx=2)
         ttk.Button(parent, text=">>", command=self.last_page).pack(side=tk.LEFT, padx=2)
+        ttk.Label(parent, text="Aller à:").pack(side=tk.LEFT, padx=(20, 5))
+        self.goto_page_var = tk.StringVar()
+        goto_entry = ttk.Entry(parent, textvariable=self.goto_page_var, width=6)
+        goto_entry.pack(side=tk.LEFT, padx=2)
+        goto_entry.bind("<Return>", self.go_to_page)
         ttk.Label(parent, text="Taille:").pack(side=tk.LEFT, padx=(20, 5))
         self.page_size_var = tk.StringVar(value="100")
-        page_size_combo = ttk.Combobox(parent, textvariable=self.page_size_var, values=["50", "100", "200", "500"], width=8)
+        page_size_combo = ttk.Combobox(parent, textvariable=self.page_size_var, values=["50", "100", "200", "500", "1000", "5000", "20000"], width=8)
         page_size_combo.pack(side=tk.LEFT, padx=2)
         page_size_combo.bind("<<ComboboxSelected>>", self.change_page_size)
+        # Total approximatif pour les filtres très larges (évite un COUNT(*) complet)
+        self.estimate_count_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(parent, text="Total estimé", variable=self.estimate_count_var, command=self.search_data).pack(side=tk.LEFT, padx=(20, 2))
 
         screen_height = self.root.winfo_screenheight()
         if screen_height <= 768:
@@ -728,11 +1132,14 @@ class OCPPiecesManager:
         
         delete_btn = ttk.Button(delete_frame, text="🗑 Supprimer", command=self.delete_record, style="Danger.TButton")
         delete_btn.pack(fill=tk.X)
+
+        bulk_btn = ttk.Button(parent, text="✎ Modification groupée", command=self.show_bulk_edit_dialog, style="Action.TButton")
+        bulk_btn.pack(fill=tk.X, pady=(3, 0))
         
-        for btn in [new_btn, edit_btn, save_btn, cancel_btn, delete_btn]:
+        for btn in [new_btn, edit_btn, save_btn, cancel_btn, delete_btn, bulk_btn]:
             self.add_hover_effect(btn)
         
-        self.action_buttons = {'new': new_btn, 'edit': edit_btn, 'save': save_btn, 'cancel': cancel_btn, 'delete': delete_btn}
+        self.action_buttons = {'new': new_btn, 'edit': edit_btn, 'save': save_btn, 'cancel': cancel_btn, 'delete': delete_btn, 'bulk': bulk_btn}
         
     def add_hover_effect(self, widget):
         def on_enter(e): widget.configure(cursor="hand2")
@@ -740,35 +1147,119 @@ class OCPPiecesManager:
         widget.bind("<Enter>", on_enter)
         widget.bind("<Leave>", on_leave)
 
-    def load_data(self):
+    def load_data(self, keep_position=False, live=False, action="Chargement", token=None):
+        # La requête part sur l'executor : le thread Tk reste libre pendant son exécution.
+        # Une nouvelle recherche interrompt la précédente (dont le résultat sera ignoré).
+        # Le temps mesuré va jusqu'à l'affichage de la page (token : action déjà commencée, ex. sauvegarde)
+        if token is None:
+            token = self.metrics.start(action)
+        if self.query_cancel is not None:
+            self.query_cancel.set()
+        self.query_generation += 1
+        self.query_cancel = threading.Event()
+        filters = self.get_current_filters()
+        sort = self.get_current_sort()
+        base_ids = None
+        if not live:
+            # Pagination, rechargement après écriture... : la base d'affinage n'est plus sûre
+            self.refine_base = None
+        elif self.refine_base is not None and sort == "article" and self.db_manager.filters_narrow(self.refine_base[0], filters):
+            base_ids = self.refine_base[1]
+        estimate = self.estimate_count_var.get()
+        future = self.executor.submit(
+            self.run_search, filters, sort, estimate, self.get_page_query(), self.query_cancel, live, base_ids
+        )
+        self.loading = True
+        self.update_status("Chargement en cours...", "loading")
+        self.progress_bar.start()
+        self.root.after(15, self.poll_search, future, self.query_generation, keep_position, filters, token)
+
+    def refresh_data(self):
+        # F5 : relecture complète de la base, sans rien reprendre des caches
+        self.db_manager.invalidate_caches()
+        self.load_data(keep_position=True, action="Actualisation")
+
+    def run_search(self, filters, sort, estimate, page_query, cancel_event, live=False, base_ids=None):
+        # Exécuté sur un worker : accès base uniquement, aucun appel Tk.
+        # Seules les clés de la page sont lues ; le contenu des lignes est chargé à l'affichage.
+        limit = page_query['limit']
+        if base_ids is not None:
+            # Le terme prolonge le précédent : seuls ses résultats sont refiltrés
+            all_keys = self.db_manager.refine_pieces(filters, base_ids, cancel_event)
+            keys, total_count, is_estimate = all_keys[:limit], len(all_keys), False
+            return keys, self.first_rows(keys), total_count, is_estimate, [key[0] for key in all_keys]
+        if live and sort == "article":
+            # Pendant la saisie, toutes les clés d'un résultat restreint sont gardées pour l'affinage
+            # (le comptage est mis en cache : search_pieces le relira sans le recalculer)
+            total_count, estimated = self.db_manager.count_pieces(filters, estimate=estimate)
+            if not estimated and total_count <= self.REFINE_MAX_ROWS:
+                page_query = dict(page_query, limit=max(limit, total_count + 1))
+        all_keys, total_count = self.db_manager.search_pieces(
+            filters=filters, sort=sort, estimate_count=estimate, columns=("id", "article"), cancel_event=cancel_event, **page_query
+        )
+        keys = all_keys[:limit]
+        complete = [key[0] for key in all_keys] if live and sort == "article" and len(all_keys) < page_query['limit'] else None
+        # Le total vient du cache : relire l'indicateur "estimé" ne coûte rien
+        is_estimate = estimate and self.db_manager.count_pieces(filters, estimate=True)[1]
+        return keys, self.first_rows(keys), total_count, is_estimate, complete
+
+    def first_rows(self, keys):
+        # Lignes visibles dès l'affichage (et celles du premier défilement)
+        return self.db_manager.get_pieces_by_ids([key[0] for key in keys[:2 * self.virtual_tree.visible]])
+
+    def schedule_live_search(self, event=None):
+        # Saisie différée : seule la dernière frappe d'une rafale déclenche une recherche
+        if not self.live_search_var.get():
+            return
+        if self.live_search_job is not None:
+            self.root.after_cancel(self.live_search_job)
+        self.live_search_job = self.root.after(self.LIVE_SEARCH_DELAY, self.live_search)
+
+    def live_search(self):
+        self.live_search_job = None
+        filters = self.get_current_filters()
+        if filters == self.live_filters:
+            return  # Touche sans effet sur les filtres (flèches, Maj...)
+        self.live_filters = filters
+        self.current_page = 0
+        self.page_anchor = None
+        self.load_data(live=True, action="Recherche instantanée")
+
+    def poll_search(self, future, generation, keep_position=False, filters=None, token=None):
+        if generation != self.query_generation:
+            return  # Recherche remplacée par une plus récente : résultat ignoré
+        if not future.done():
+            self.root.after(15, self.poll_search, future, generation, keep_position, filters, token)
+            return
+        self.loading = False
+        self.query_cancel = None
+        self.progress_bar.stop()
         try:
-            self.update_status("Chargement en cours...", "loading")
-            self.progress_bar.start()
-            
-            filters = self.get_current_filters()
-            results, total_count = self.db_manager.search_pieces(
-                filters=filters, limit=self.page_size, offset=self.current_page * self.page_size
-            )
-            
-            self.total_records = total_count
-            self.update_treeview(results)
-            self.update_pagination()
-            
-            if results:
-                self.update_status(f"Chargement terminé", "success")
-            else:
-                self.update_status("Aucun résultat trouvé", "warning")
-                
+            keys, first_rows, total_count, is_estimate, complete = future.result()
         except Exception as e:
             self.update_status(f"Erreur: {str(e)}", "error")
             messagebox.showerror("Erreur", f"Erreur lors du chargement: {str(e)}")
-        finally:
-            self.progress_bar.stop()
+            return
+        self.refine_base = (filters, complete) if complete is not None else None
+        self.live_filters = filters
+        self.total_records = total_count
+        self.total_is_estimate = is_estimate
+        self.page_keys = ((keys[0][1], keys[0][0]), (keys[-1][1], keys[-1][0])) if keys else None
+        self.virtual_tree.set_data([key[0] for key in keys], first_rows, keep_position)
+        self.update_pagination()
+        if keys:
+            self.update_status(f"Chargement terminé", "success")
+        else:
+            self.update_status("Aucun résultat trouvé", "warning")
+        self.metrics.finish(token, lignes=len(keys), total=total_count)
+        if self.startup_pending:
+            self.startup_pending = False
+            self.root.after_idle(self.report_startup)
 
     def get_current_filters(self):
         filters = {}
         if self.search_article.get().strip(): filters['article'] = self.search_article.get().strip()
-        # Recherche : si l'utilisateur tape 'vide' dans Code SAP, filtrer les codes SAP vides/None/NaN
+        # Recherche : si l'utilisateur tape 'vide' dans Code SAP, filtrer les pièces sans code SAP
         code_sap_val = self.search_sap.get().strip()
         if code_sap_val:
             if code_sap_val.lower() == 'vide':
@@ -781,33 +1272,57 @@ class OCPPiecesManager:
         if self.search_unite.get() != "Tous": filters['unite'] = self.search_unite.get()
         if self.search_quantite_installee.get().strip(): filters['quantite_installee'] = self.search_quantite_installee.get().strip()
         if self.search_situation.get().strip(): filters['situation'] = self.search_situation.get().strip()
+        # Bornes de quantité : "10", "12,5"... (une saisie non numérique est ignorée)
+        quantite_min = parse_quantite(self.search_quantite_min.get())
+        if quantite_min is not None: filters['quantite_min'] = quantite_min
+        quantite_max = parse_quantite(self.search_quantite_max.get())
+        if quantite_max is not None: filters['quantite_max'] = quantite_max
+        missing = self.MISSING_FIELD_CHOICES.get(self.search_missing.get())
+        if missing: filters['missing'] = missing
         return filters
 
-    def update_treeview(self, results):
-        for item in self.tree.get_children(): self.tree.delete(item)
-        for idx, row in enumerate(results):
-            # Affichage : remplacer NaN, 'nan', None ou '' par '' pour le code SAP
-            row = list(row[:10])
-            code_sap_val = row[2]
-            if code_sap_val is None or (isinstance(code_sap_val, float) and math.isnan(code_sap_val)) or str(code_sap_val).lower() == 'nan':
-                row[2] = ''
-            # Ajout colonne Image ?
-            image_path = row[9] if len(row) > 9 else None
-            has_image = (image_path and os.path.exists(image_path))
-            image_status = "✅" if has_image else "❌"
-            display_row = row + [image_status]
-            tag = 'oddrow' if idx % 2 else 'evenrow'
-            self.tree.insert("", tk.END, values=display_row, tags=(tag,))
-        self.tree.tag_configure('oddrow', background=self.treeview_row_colors[1])
-        self.tree.tag_configure('evenrow', background=self.treeview_row_colors[0])
+    def get_page_query(self):
+        # Traduit la position de la page en paramètres de pagination par clé (temps constant)
+        limit = self.page_size
+        if self.get_current_sort() != "article":
+            return {'limit': limit, 'offset': self.current_page * self.page_size}
+        kind, key = self.page_anchor or (None, None)
+        if kind == 'after':
+            return {'limit': limit, 'after': key}
+        if kind == 'before':
+            return {'limit': limit, 'before': key}
+        if kind == 'end':
+            # La dernière page ne contient que le reste de la division
+            remainder = self.total_records - self.current_page * self.page_size
+            return {'limit': remainder if remainder > 0 else limit, 'from_end': True}
+        if kind == 'offset':
+            return {'limit': limit, 'offset': key}
+        return {'limit': limit}
+
+    def get_current_sort(self):
+        # Le tri par pertinence (score FTS5) n'a de sens qu'avec un filtre texte
+        return "pertinence" if self.search_tri.get() == "Pertinence" else "article"
+
+    def format_tree_row(self, piece, index):
+        # Valeurs et couleur d'une ligne de la liste virtuelle
+        tag = 'oddrow' if index % 2 else 'evenrow'
+        if piece is None:
+            return ("",) * 10, (tag,)
+        # Affichage : champs vides (NULL en base) affichés ''
+        row = ["" if value is None else value for value in piece[:9]]
+        # Ajout colonne Image ? (indicateur stocké en base, aucun accès disque)
+        image_status = "✅" if piece[12] else "❌"
+        return tuple(row + [image_status]), (tag,)
 
     def update_pagination(self):
         total_pages = max(1, (self.total_records + self.page_size - 1) // self.page_size)
-        self.page_label.config(text=f"Page {self.current_page + 1} / {total_pages}")
+        prefix = "≈ " if self.total_is_estimate else ""
+        self.page_label.config(text=f"Page {self.current_page + 1} / {prefix}{total_pages}")
 
     def search_data(self):
         self.current_page = 0
-        self.load_data()
+        self.page_anchor = None
+        self.load_data(action="Recherche")
 
     def reset_search(self):
         self.search_article.delete(0, tk.END)
@@ -818,20 +1333,44 @@ class OCPPiecesManager:
         self.search_unite.set("Tous")
         self.search_quantite_installee.delete(0, tk.END)
         self.search_situation.delete(0, tk.END)
+        self.search_quantite_min.delete(0, tk.END)
+        self.search_quantite_max.delete(0, tk.END)
+        self.search_missing.set("Aucun")
+        self.search_tri.set("Article")
         self.current_page = 0
-        self.load_data()
+        self.page_anchor = None
+        self.load_data(action="Réinitialisation")
 
-    def first_page(self): self.current_page = 0; self.load_data()
+    def first_page(self): self.current_page = 0; self.page_anchor = None; self.load_data(action="Page")
     def prev_page(self):
-        if self.current_page > 0: self.current_page -= 1; self.load_data()
+        # Les pages voisines se calculent à partir des clés de la page affichée : attendre qu'elle soit chargée
+        if self.loading: return
+        if self.current_page > 0:
+            self.current_page -= 1
+            self.page_anchor = ('before', self.page_keys[0]) if self.current_page and self.page_keys else None
+            self.load_data(action="Page")
     def next_page(self):
+        if self.loading: return
         total_pages = (self.total_records + self.page_size - 1) // self.page_size
-        if self.current_page < total_pages - 1: self.current_page += 1; self.load_data()
+        if self.current_page < total_pages - 1 and self.page_keys:
+            self.current_page += 1; self.page_anchor = ('after', self.page_keys[1]); self.load_data(action="Page")
     def last_page(self):
-        self.current_page = max(0, (self.total_records + self.page_size - 1) // self.page_size - 1); self.load_data()
-    def change_page_size(self, event): self.page_size = int(self.page_size_var.get()); self.current_page = 0; self.load_data()
+        self.current_page = max(0, (self.total_records + self.page_size - 1) // self.page_size - 1)
+        self.page_anchor = ('end', None) if self.current_page else None
+        self.load_data(action="Page")
+    def go_to_page(self, event=None):
+        # Saut direct : seul cas où l'on retombe sur OFFSET
+        try: page = int(self.goto_page_var.get()) - 1
+        except ValueError: return
+        total_pages = max(1, (self.total_records + self.page_size - 1) // self.page_size)
+        self.current_page = min(max(page, 0), total_pages - 1)
+        self.page_anchor = ('offset', self.current_page * self.page_size) if self.current_page else None
+        self.goto_page_var.set("")
+        self.load_data(action="Page")
+    def change_page_size(self, event): self.page_size = int(self.page_size_var.get()); self.current_page = 0; self.page_anchor = None; self.load_data(action="Page")
 
     def on_item_select(self, event):
+        token = self.metrics.start("Sélection")
         selection = self.tree.selection()
         if selection:
             values = self.tree.item(selection[0])["values"]
@@ -842,19 +1381,87 @@ class OCPPiecesManager:
             self.current_piece_id = None
         self.update_button_states()
         self.update_status(self.status_bar.cget("text").split(" ", 1)[1])
+        self.metrics.finish(token)
 
     def load_piece_details_from_id(self, piece_id):
         if piece_id:
             piece_data = self.db_manager.get_piece_by_id(piece_id)
             if piece_data: self.load_piece_details(piece_data)
     
-    def resize_image(self, image_path, max_size=(800, 600)):
+    def import_images_folder(self):
+        # Import en lot : chaque fichier est rattaché à la pièce dont l'article ou le code SAP est son nom
+        if self.editing_mode:
+            messagebox.showwarning("Attention", "Terminez d'abord la modification en cours.")
+            return
+        folder = filedialog.askdirectory(title="Dossier d'images à importer")
+        if not folder:
+            return
+        progress = {'done': 0, 'total': 0, 'start': time.perf_counter()}
+        win, report = self.create_progress_dialog("Import d'images", "Import des images en cours...", unit="images")
+        future = self.background_executor.submit(self.run_image_import, folder, progress)
+        self.root.after(100, self.poll_image_import, future, win, report, progress)
+
+    def run_image_import(self, folder, progress):
+        # Exécuté sur un worker : correspondances en base, redimensionnements dans un pool de processus
+        files = {}
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                stem, ext = os.path.splitext(entry.name)
+                if entry.is_file() and ext.lower() in self.IMAGE_EXTENSIONS:
+                    files.setdefault(stem.strip(), entry.path)
+        # Noms de fichiers tels quels puis en majuscules (articles et codes saisis en majuscules)
+        lookup = {}
+        for stem in files:
+            lookup[stem] = stem
+            lookup.setdefault(stem.upper(), stem)
+        jobs, assigned = {}, set()
+        for code, pieces in self.db_manager.find_pieces_by_codes(lookup).items():
+            for piece_id, old_path in pieces:
+                if piece_id not in assigned:
+                    assigned.add(piece_id)
+                    jobs.setdefault(files[lookup[code]], []).append((piece_id, old_path))
+        progress['total'] = len(jobs)
+        assignments, errors = [], []
+        with ProcessPoolExecutor() as pool:
+            futures = {pool.submit(store_image_file, source, self.images_folder): pieces for source, pieces in jobs.items()}
+            for future in as_completed(futures):
+                try:
+                    # Même image pour plusieurs pièces (code SAP partagé) : un seul fichier dans le magasin
+                    destination = future.result()
+                    assignments += [(piece_id, old_path, destination) for piece_id, old_path in futures[future]]
+                except Exception as e:
+                    errors.append(str(e))
+                progress['done'] += 1
+        self.db_manager.set_image_paths(assignments)
+        # Les images remplacées ne sont supprimées que si plus aucune pièce ne les utilise
+        self.image_store.release([old_path for _, old_path, new_path in assignments if old_path != new_path])
+        return {'files': len(files), 'matched': len(jobs), 'pieces': len(assignments), 'errors': errors,
+                'seconds': time.perf_counter() - progress['start']}
+
+    def poll_image_import(self, future, win, report, progress):
+        if not future.done():
+            report(progress['done'], progress['total'], progress['done'] / max(time.perf_counter() - progress['start'], 1e-6))
+            self.root.after(100, self.poll_image_import, future, win, report, progress)
+            return
+        win.destroy()
         try:
-            with Image.open(image_path) as img:
-                if img.width > max_size[0] or img.height > max_size[1]:
-                    img.thumbnail(max_size, Image.Resampling.LANCZOS)
-                    img.save(image_path, optimize=True, quality=85)
-        except Exception as e: print(f"Erreur lors du redimensionnement: {e}")
+            result = future.result()
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Erreur d'import des images: {str(e)}")
+            self.update_status("Erreur import images", "error")
+            return
+        message = (f"{result['pieces']} pièce(s) mises à jour à partir de {result['matched']} image(s)"
+                   f" ({result['matched'] / max(result['seconds'], 1e-6):.1f} images/s).\n"
+                   f"{result['files'] - result['matched']} fichier(s) sans pièce correspondante.")
+        if result['errors']:
+            message += f"\n{len(result['errors'])} erreur(s), dont : {result['errors'][0]}"
+        messagebox.showinfo("Import d'images", message)
+        self.update_status(f"{result['pieces']} image(s) importée(s).", "success")
+        if self.current_piece_id is not None:
+            piece_data = self.db_manager.get_piece_by_id(self.current_piece_id)
+            if piece_data:
+                self.load_piece_details(piece_data)
+        self.load_data(keep_position=True)
 
     def show_details_window(self, event):
         selection = self.tree.selection()
@@ -890,19 +1497,28 @@ class OCPPiecesManager:
         image_frame.pack(fill=tk.BOTH, expand=True, side=tk.TOP)
         image_label = ttk.Label(image_frame, text="Chargement...", anchor=tk.CENTER)
         image_label.pack(fill=tk.BOTH, expand=True)
-        def load_image_in_thread(path, target_label):
-            if path and os.path.exists(path):
-                try:
-                    image = Image.open(path)
-                    image.thumbnail((550, 450), Image.Resampling.LANCZOS)
-                    photo = ImageTk.PhotoImage(image)
-                    target_label.config(image=photo, text="")
-                    target_label.image = photo
-                except:
-                    target_label.config(image="", text="Erreur d'image")
+        image_path = piece_data[9]
+        if not (image_path and piece_data[12]):
+            image_label.config(image="", text="Aucune image associée")
+        else:
+            # Miniature déjà en mémoire : affichage immédiat, sinon génération/lecture sur l'executor
+            key = (image_path, piece_data[13], piece_data[14], "grande")
+            photo = self.thumbnails.cached_photo(key)
+            if photo is not None:
+                image_label.config(image=photo, text="")
             else:
-                target_label.config(image="", text="Aucune image associée")
-        threading.Thread(target=load_image_in_thread, args=(piece_data[9], image_label), daemon=True).start()
+                future = self.executor.submit(self.thumbnails.thumbnail_path, image_path, "grande")
+                def show_thumbnail():
+                    if not image_label.winfo_exists():
+                        return
+                    if not future.done():
+                        details_win.after(30, show_thumbnail)
+                        return
+                    try:
+                        image_label.config(image=self.thumbnails.load_photo(key, future.result()), text="")
+                    except Exception:
+                        image_label.config(image="", text="Erreur d'image")
+                details_win.after(30, show_thumbnail)
         # Focus automatique sur la fenêtre
         details_win.after(200, lambda: details_win.focus_force())
 
@@ -916,15 +1532,48 @@ class OCPPiecesManager:
         else: messagebox.showerror("Erreur", f"Impossible de charger la pièce ID {self.current_piece_id}.")
 
     def export_to_excel(self):
+        if self.export_cancel is not None:
+            messagebox.showinfo("Export", "Un export est déjà en cours.")
+            return
         file_path = filedialog.asksaveasfilename(title="Exporter vers Excel", defaultextension=".xlsx", filetypes=[("Excel files", "*.xlsx")])
         if file_path:
-            try:
-                self.update_status("Exportation...", "loading"); self.progress_bar.start()
-                count = self.db_manager.export_to_excel(file_path, self.get_current_filters())
-                self.update_status("Export terminé.", "success")
-                messagebox.showinfo("Export terminé", f"{count} enregistrements exportés vers:\n{file_path}")
-            except Exception as e: messagebox.showerror("Erreur", f"Erreur d'export: {str(e)}"); self.update_status("Erreur export", "error")
-            finally: self.progress_bar.stop()
+            # L'export tourne sur l'executor des longs travaux ; le thread Tk se contente de suivre la progression
+            token = self.metrics.start("Export")
+            self.export_cancel = threading.Event()
+            progress = {'done': 0, 'total': 0}
+            def report(done, total): progress.update(done=done, total=total)
+            future = self.background_executor.submit(self.db_manager.export_to_excel, file_path, self.get_current_filters(), report, self.export_cancel)
+            self.progress_bar.config(mode='determinate', maximum=100, value=0)
+            self.cancel_export_btn.grid()
+            self.update_status("Exportation...", "loading")
+            self.root.after(100, self.poll_export, future, file_path, progress, token)
+
+    def poll_export(self, future, file_path, progress, token=None):
+        if not future.done():
+            if progress['total']:
+                self.progress_bar['value'] = progress['done'] * 100 / progress['total']
+            self.update_status(f"Exportation... {progress['done']} / {progress['total']}", "loading")
+            self.root.after(100, self.poll_export, future, file_path, progress, token)
+            return
+        self.export_cancel = None
+        self.cancel_export_btn.grid_remove()
+        self.progress_bar.config(mode='indeterminate', value=0)
+        try:
+            count = future.result()
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Erreur d'export: {str(e)}"); self.update_status("Erreur export", "error")
+            return
+        if count is None:
+            self.update_status("Export annulé.", "warning")
+        else:
+            self.update_status("Export terminé.", "success")
+            self.metrics.finish(token, lignes=count)
+            messagebox.showinfo("Export terminé", f"{count} enregistrements exportés vers:\n{file_path}")
+
+    def cancel_export(self):
+        if self.export_cancel is not None:
+            self.export_cancel.set()
+            self.update_status("Annulation de l'export...", "warning")
 
     def create_status_bar(self, parent):
         status_main_frame = ttk.Frame(parent, style="Modern.TFrame")
@@ -937,11 +1586,19 @@ class OCPPiecesManager:
         ttk.Separator(status_frame, orient='vertical').grid(row=0, column=1, sticky="ns", padx=10)
         self.info_label = ttk.Label(status_frame, text="", font=("Segoe UI", 10), foreground="#6b7280", background="#f8fafc")
         self.info_label.grid(row=0, column=2, padx=(0, 14), sticky="w")
+        # Derniers temps de réponse mesurés (et blocages de l'interface)
+        self.metrics_label = ttk.Label(status_frame, text="", font=("Segoe UI", 9), foreground="#6b7280", background="#f8fafc")
+        self.metrics_label.grid(row=0, column=3, padx=(0, 14), sticky="e")
         self.time_label = ttk.Label(status_frame, text="", font=("Segoe UI", 10), foreground="#6b7280", background="#f8fafc")
-        self.time_label.grid(row=0, column=3, padx=(0, 14), sticky="e")
+        self.time_label.grid(row=0, column=4, padx=(0, 14), sticky="e")
         self.update_time()
         self.progress_bar = ttk.Progressbar(status_main_frame, mode='indeterminate', style="Modern.Horizontal.TProgressbar")
         self.progress_bar.grid(row=1, column=0, sticky="ew", pady=(0, 7))
+        status_main_frame.columnconfigure(0, weight=1)
+        # Bouton d'annulation, visible uniquement pendant un export
+        self.cancel_export_btn = ttk.Button(status_main_frame, text="Annuler l'export", command=self.cancel_export, style="Red.TButton")
+        self.cancel_export_btn.grid(row=1, column=1, padx=(10, 0), pady=(0, 7))
+        self.cancel_export_btn.grid_remove()
 
     def update_time(self):
         self.time_label.config(text=datetime.now().strftime("%H:%M:%S - %d/%m/%Y"))
@@ -954,16 +1611,18 @@ class OCPPiecesManager:
         self.status_bar.config(text=f"{icon} {message}", foreground=color)
         
         if hasattr(self, 'total_records'):
-            selected = len(self.tree.selection())
-            info_text = f"Total: {self.total_records}" + (f" | Sélectionnés: {selected}" if selected > 0 else "")
+            selected = len(self.virtual_tree.selected_ids)
+            info_text = f"Total: {'≈ ' if self.total_is_estimate else ''}{self.total_records}" + (f" | Sélectionnés: {selected}" if selected > 0 else "")
             self.info_label.config(text=info_text)
-        self.root.update_idletasks()
+
+    def show_metrics(self):
+        self.metrics_label.config(text=self.metrics.summary())
         
     def update_button_states(self):
         if not hasattr(self, 'action_buttons'): return
         is_item_selected = bool(self.current_piece_id)
         if self.editing_mode:
-            for name, state in {'new': 'disabled', 'edit': 'disabled', 'save': 'normal', 'cancel': 'normal', 'delete': 'disabled'}.items():
+            for name, state in {'new': 'disabled', 'edit': 'disabled', 'save': 'normal', 'cancel': 'normal', 'delete': 'disabled', 'bulk': 'disabled'}.items():
                 self.action_buttons[name].configure(state=state)
         else:
             self.action_buttons['new'].configure(state='normal')
@@ -971,6 +1630,7 @@ class OCPPiecesManager:
             self.action_buttons['save'].configure(state='disabled')
             self.action_buttons['cancel'].configure(state='disabled')
             self.action_buttons['delete'].configure(state='normal' if is_item_selected else 'disabled')
+            self.action_buttons['bulk'].configure(state='normal')
 
     def setup_keyboard_shortcuts(self):
         self.root.bind('<Control-n>', lambda e: self.new_record())
@@ -979,15 +1639,17 @@ class OCPPiecesManager:
         self.root.bind('<Control-d>', lambda e: self.delete_record())
         self.root.bind('<Escape>', lambda e: self.cancel_changes())
         self.root.bind('<Control-f>', lambda e: self.search_article.focus_set())
-        self.root.bind('<F5>', lambda e: self.load_data())
+        self.root.bind('<F5>', lambda e: self.refresh_data())
         self.root.bind('<Control-Left>', lambda e: self.prev_page())
         self.root.bind('<Control-Right>', lambda e: self.next_page())
         self.root.bind('<Control-Home>', lambda e: self.first_page())
         self.root.bind('<Control-End>', lambda e: self.last_page())
         self.root.bind('<Control-Alt-e>', lambda e: self.export_to_excel())
         self.root.bind('<Control-i>', lambda e: self.load_image())
+        self.root.bind('<Control-b>', lambda e: self.show_bulk_edit_dialog())
         self.root.bind('<Control-Delete>', lambda e: self.remove_image())
-        for widget in [self.search_article, self.search_sap, self.search_description, self.search_quantite_installee, self.search_situation]:
+        for widget in [self.search_article, self.search_sap, self.search_description, self.search_quantite_installee, self.search_situation,
+                       self.search_quantite_min, self.search_quantite_max]:
             widget.bind('<Return>', lambda e: self.search_data())
 
     def create_help_menu(self):
@@ -997,6 +1659,15 @@ class OCPPiecesManager:
         history_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Historique", menu=history_menu)
         history_menu.add_command(label="Afficher l'historique", command=self.show_history_window)
+        history_menu.add_command(label="Statistiques du cache", command=self.show_cache_stats)
+        images_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Images", menu=images_menu)
+        images_menu.add_command(label="Importer un dossier d'images...", command=self.import_images_folder)
+        maintenance_menu = tk.Menu(menubar, tearoff=0)
+        menubar.add_cascade(label="Maintenance", menu=maintenance_menu)
+        # En mode service, la vérification se lance sur la machine du service (cli_ocp.py maintenance)
+        maintenance_menu.add_command(label="Vérifier les images...", command=self.start_image_scan,
+                                     state="disabled" if self.remote else "normal")
         # Menu Aide
         help_menu = tk.Menu(menubar, tearoff=0)
         menubar.add_cascade(label="Aide", menu=help_menu)
@@ -1004,6 +1675,17 @@ class OCPPiecesManager:
         help_menu.add_separator()
         help_menu.add_command(label="À propos", command=self.show_about)
 
+    def show_cache_stats(self):
+        # Taux de succès des caches de la base, pour régler leurs tailles
+        labels = {"totaux": "Totaux", "resultats": "Pages de résultats", "lignes": "Lignes"}
+        lines = []
+        for name, stats in self.db_manager.cache_stats().items():
+            requests = stats['hits'] + stats['misses']
+            rate = 100 * stats['hits'] / requests if requests else 0
+            lines.append(f"{labels[name]} : {stats['hits']} succès / {stats['misses']} échecs ({rate:.0f}%)"
+                         f" - {stats['size']}/{stats['capacity']} entrées")
+        messagebox.showinfo("Statistiques du cache", "\n".join(lines))
+
     def show_shortcuts_window(self):
         win = tk.Toplevel(self.root); win.title("Raccourcis clavier")
         
@@ -1019,7 +1701,8 @@ class OCPPiecesManager:
         shortcuts = [
             ("Ctrl+N", "Nouveau"), ("Ctrl+E", "Modifier"), ("Ctrl+S", "Sauvegarder"), ("Ctrl+D / Ctrl+Suppr", "Supprimer pièce/image"),
             ("Échap", "Annuler"), ("Ctrl+F", "Focus Recherche"), ("F5", "Actualiser les données"), ("Ctrl+Gauche/Droite", "Page préc./suiv."),
-            ("Ctrl+Début/Fin", "Première/Dernière page"), ("Ctrl+Alt+E", "Exporter Excel"), ("Ctrl+I", "Charger image"), ("Entrée", "Rechercher")
+            ("Ctrl+Début/Fin", "Première/Dernière page"), ("Ctrl+Alt+E", "Exporter Excel"), ("Ctrl+I", "Charger image"), ("Ctrl+B", "Modification groupée"),
+            ("Entrée", "Rechercher")
         ]
         for sc, act in shortcuts: tree.insert("", tk.END, values=(sc, act))
         tree.pack(fill=tk.BOTH, expand=True)
@@ -1032,33 +1715,147 @@ class OCPPiecesManager:
         win = tk.Toplevel(self.root)
         win.title("Historique des modifications")
         screen_width = self.root.winfo_screenwidth()
-        hist_width = min(max(int(screen_width * 0.35), 500), 800)
-        win.geometry(f"{hist_width}x500")
+        hist_width = min(max(int(screen_width * 0.5), 700), 1100)
+        win.geometry(f"{hist_width}x600")
         win.resizable(True, True)
         win.transient(self.root)
         win.grab_set()
         frame = ttk.Frame(win, padding="15")
         frame.pack(fill=tk.BOTH, expand=True)
         ttk.Label(frame, text="Historique des modifications", font=("Segoe UI", 16, "bold")).pack(pady=(0, 10))
-        text = tk.Text(frame, wrap=tk.WORD, height=25, state="normal", font=("Segoe UI", 10))
-        text.pack(fill=tk.BOTH, expand=True)
-        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=text.yview)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        text.config(yscrollcommand=scrollbar.set)
-        try:
-            with open(self.HISTORIQUE_FILE, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            content = f"Erreur de lecture de l'historique : {e}"
-        text.insert(tk.END, content)
-        text.config(state="disabled")
-        ttk.Button(frame, text="Fermer", command=win.destroy).pack(pady=(10, 0))
+
+        filters_frame = ttk.Frame(frame)
+        filters_frame.pack(fill=tk.X, pady=(0, 8))
+        ttk.Label(filters_frame, text="ID pièce:").pack(side=tk.LEFT)
+        piece_entry = ttk.Entry(filters_frame, width=8)
+        piece_entry.pack(side=tk.LEFT, padx=(5, 12))
+        ttk.Label(filters_frame, text="Action:").pack(side=tk.LEFT)
+        action_combo = ttk.Combobox(filters_frame, width=18, state="readonly",
+                                    values=["Toutes"] + self.db_manager.history_actions())
+        action_combo.set("Toutes")
+        action_combo.pack(side=tk.LEFT, padx=(5, 12))
+        ttk.Label(filters_frame, text="Du:").pack(side=tk.LEFT)
+        from_entry = ttk.Entry(filters_frame, width=11)
+        from_entry.pack(side=tk.LEFT, padx=(5, 12))
+        ttk.Label(filters_frame, text="Au:").pack(side=tk.LEFT)
+        to_entry = ttk.Entry(filters_frame, width=11)
+        to_entry.pack(side=tk.LEFT, padx=(5, 12))
+
+        panes = ttk.PanedWindow(frame, orient=tk.VERTICAL)
+        panes.pack(fill=tk.BOTH, expand=True)
+        list_frame = ttk.Frame(panes)
+        tree = ttk.Treeview(list_frame, columns=("Date", "Action", "ID", "Détails"), show="headings", height=14)
+        for column, width in (("Date", 140), ("Action", 130), ("ID", 60), ("Détails", 400)):
+            tree.heading(column, text=column)
+            tree.column(column, width=width, stretch=column == "Détails")
+        tree_scroll = ttk.Scrollbar(list_frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=tree_scroll.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tree_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        text = tk.Text(panes, wrap=tk.WORD, height=8, state="disabled", font=("Segoe UI", 10))
+        panes.add(list_frame, weight=3)
+        panes.add(text, weight=1)
+
+        nav_frame = ttk.Frame(frame)
+        nav_frame.pack(fill=tk.X, pady=(8, 0))
+        status_label = ttk.Label(nav_frame, text="")
+        # Page affichée : ses évènements et les bornes d'id pour la pagination par clé
+        page = {'entries': {}, 'first': None, 'last': None, 'number': 0}
+
+        def current_filters():
+            piece_id = piece_entry.get().strip()
+            if piece_id and not piece_id.isdigit():
+                raise ValueError("L'ID pièce doit être un nombre")
+            for value in (from_entry.get().strip(), to_entry.get().strip()):
+                if value:
+                    datetime.strptime(value, "%Y-%m-%d")
+            return {
+                'piece_id': int(piece_id) if piece_id else None,
+                'action': action_combo.get() if action_combo.get() != "Toutes" else None,
+                'date_from': from_entry.get().strip() or None,
+                'date_to': to_entry.get().strip() or None,
+            }
+
+        def show_page(direction=None):
+            try:
+                filters = current_filters()
+            except ValueError as e:
+                messagebox.showwarning("Filtre invalide", f"{e} (dates au format AAAA-MM-JJ)", parent=win)
+                return
+            if direction == 'older':
+                filters['before_id'] = page['last']
+            elif direction == 'newer':
+                filters['after_id'] = page['first']
+            entries = self.db_manager.search_history(limit=self.HISTORY_PAGE_SIZE, **filters)
+            if direction and not entries:
+                return  # Bord du journal atteint : la page courante reste affichée
+            page['number'] = 0 if direction is None else page['number'] + (1 if direction == 'older' else -1)
+            page['entries'] = {str(entry[0]): entry for entry in entries}
+            page['first'] = entries[0][0] if entries else None
+            page['last'] = entries[-1][0] if entries else None
+            tree.delete(*tree.get_children())
+            for entry in entries:
+                tree.insert("", tk.END, iid=str(entry[0]), values=(entry[3], entry[2], "" if entry[1] is None else entry[1], entry[4] or ""))
+            show_entry()
+            status_label.config(text=f"Page {page['number'] + 1} - {len(entries)} évènement(s)")
+
+        def show_entry(event=None):
+            selection = tree.selection()
+            content = self.format_history_entry(page['entries'][selection[0]]) if selection else ""
+            text.config(state="normal")
+            text.delete(1.0, tk.END)
+            text.insert(tk.END, content)
+            text.config(state="disabled")
+
+        tree.bind("<<TreeviewSelect>>", show_entry)
+        for widget in (piece_entry, from_entry, to_entry):
+            widget.bind("<Return>", lambda e: show_page())
+        action_combo.bind("<<ComboboxSelected>>", lambda e: show_page())
+        ttk.Button(filters_frame, text="🔎 Filtrer", command=show_page).pack(side=tk.LEFT)
+        ttk.Button(nav_frame, text="◀ Plus récents", command=lambda: show_page('newer')).pack(side=tk.LEFT, padx=(0, 5))
+        ttk.Button(nav_frame, text="Plus anciens ▶", command=lambda: show_page('older')).pack(side=tk.LEFT)
+        status_label.pack(side=tk.LEFT, padx=15)
+        ttk.Button(nav_frame, text="Fermer", command=win.destroy).pack(side=tk.RIGHT)
+
+        def refresh():
+            # Ancien journal importé pendant que la fenêtre est ouverte : actions et page relues
+            action_combo.config(values=["Toutes"] + self.db_manager.history_actions())
+            show_page()
+        self.history_refresh = refresh
+        def on_destroy(event):
+            if event.widget is win and self.history_refresh is refresh:
+                self.history_refresh = None
+        win.bind("<Destroy>", on_destroy, add="+")
+        show_page()
+
+    def format_history_entry(self, entry):
+        # Même présentation que l'ancien journal texte
+        _, piece_id, action, timestamp, details, changes = entry
+        text = f"[{timestamp}] Action: {action}"
+        if piece_id is not None:
+            text += f" | ID: {piece_id}"
+        if details:
+            text += f" | {details}"
+        for field, (old_value, new_value) in json.loads(changes or "{}").items():
+            label = self.HISTORY_LABELS.get(field, field)
+            if old_value is not None and new_value is not None:
+                text += f"\n    {label} : '{old_value}' -> '{new_value}'"
+            else:
+                text += f"\n    {label} : '{new_value if old_value is None else old_value}'"
+        return text + "\n"
 
     def on_closing(self):
-        if self.editing_mode and messagebox.askyesno("Confirmation", "Des modifications sont en cours. Fermer?"):
-            self.executor.shutdown(wait=False); self.root.destroy()
-        elif not self.editing_mode:
-            self.executor.shutdown(wait=False); self.root.destroy()
+        if self.editing_mode and not messagebox.askyesno("Confirmation", "Des modifications sont en cours. Fermer?"):
+            return
+        if self.export_cancel is not None:
+            self.export_cancel.set()
+        if self.query_cancel is not None:
+            self.query_cancel.set()
+        self.reconcile_cancel.set()
+        self.executor.shutdown(wait=False)
+        self.background_executor.shutdown(wait=False)
+        self.db_manager.close()
+        self.root.destroy()
 
     def create_image_section(self, parent):
         image_buttons = ttk.Frame(parent)
@@ -1105,7 +1902,6 @@ class OCPPiecesManager:
         self.detail_vars["situation"].set("")
         self.update_button_states()
         self.update_status("Mode création", "info")
-        self.log_history("Création", self.current_piece_id, f"Article: {self.detail_vars['article'].get()}")
 
     def delete_record(self):
         if self.current_piece_id is None:
@@ -1115,14 +1911,10 @@ class OCPPiecesManager:
         if messagebox.askyesno("Confirmation", f"Supprimer la pièce ID {self.current_piece_id}?\nCette action est irréversible."):
             try:
                 piece_data = self.db_manager.get_piece_by_id(self.current_piece_id)
-                if piece_data and piece_data[9] and os.path.exists(piece_data[9]):
-                    os.remove(piece_data[9])
-                
                 self.db_manager.delete_piece(self.current_piece_id)
-                # Historique détaillé suppression
-                champs = ["Article", "Code SAP", "Description", "Description longue", "Unité de mesure", "Statut", "Quantité installée", "Situation", "Image"]
-                old_data = {champs[i]: piece_data[i+1] for i in range(len(champs))} if piece_data else None
-                self.log_history("Suppression", self.current_piece_id, f"Article: {piece_data[1] if piece_data else ''}", old_data=old_data, new_data=None)
+                # L'image n'est supprimée que si aucune autre pièce ne la partage
+                if piece_data and piece_data[9]:
+                    self.image_store.release([piece_data[9]])
                 self.current_piece_id = None
                 
                 for var in self.detail_vars.values():
@@ -1131,11 +1923,87 @@ class OCPPiecesManager:
                 self.current_image = None
                 
                 self.update_status("Pièce supprimée.", "success")
-                self.load_data()
+                self.load_data(keep_position=True)
             except Exception as e:
                 messagebox.showerror("Erreur", f"Erreur de suppression: {str(e)}")
                 self.update_status("Erreur suppression", "error")
 
+    def show_bulk_edit_dialog(self):
+        # Mêmes valeurs appliquées à la sélection ou à tous les résultats du filtre courant
+        if self.editing_mode:
+            messagebox.showwarning("Attention", "Terminez d'abord la modification en cours.")
+            return
+        selected = list(self.virtual_tree.selected_ids)
+        win = tk.Toplevel(self.root)
+        win.title("Modification groupée")
+        win.resizable(False, False)
+        win.transient(self.root)
+        win.grab_set()
+        frame = ttk.Frame(win, padding="15")
+        frame.pack(fill=tk.BOTH, expand=True)
+        ttk.Label(frame, text="Modification groupée", font=("Segoe UI", 14, "bold")).grid(row=0, column=0, columnspan=2, sticky="w", pady=(0, 10))
+        scope_var = tk.StringVar(value="selection" if selected else "filtres")
+        total_label = f"~{self.total_records}" if self.total_is_estimate else str(self.total_records)
+        selection_radio = ttk.Radiobutton(frame, text=f"Pièces sélectionnées ({len(selected)})", variable=scope_var, value="selection")
+        selection_radio.grid(row=1, column=0, columnspan=2, sticky="w")
+        if not selected:
+            selection_radio.state(["disabled"])
+        ttk.Radiobutton(frame, text=f"Tous les résultats de la recherche ({total_label})", variable=scope_var,
+                        value="filtres").grid(row=2, column=0, columnspan=2, sticky="w", pady=(0, 10))
+        # Un champ n'est modifié que si sa case est cochée (une valeur vide efface le champ)
+        unites = [unite for unite in self.search_unite['values'] if unite != "Tous"]
+        fields = [
+            ("Statut", "statut_article", ttk.Combobox(frame, values=["Actif", "Désactivé", "En attente", "Obsolète"], state="readonly", width=24)),
+            ("Unité de mesure", "unite_mesure", ttk.Combobox(frame, values=unites, width=24)),
+            ("Situation", "situation", ttk.Entry(frame, width=26)),
+            ("Quantité installée", "quantite_installee", ttk.Entry(frame, width=26)),
+        ]
+        enabled = {}
+        for row, (label, field, widget) in enumerate(fields, start=3):
+            enabled[field] = tk.BooleanVar(value=False)
+            ttk.Checkbutton(frame, text=label, variable=enabled[field]).grid(row=row, column=0, sticky="w", pady=3)
+            widget.grid(row=row, column=1, sticky="ew", padx=(10, 0), pady=3)
+
+        def apply():
+            changes = {field: widget.get().strip() for _, field, widget in fields if enabled[field].get()}
+            if not changes:
+                messagebox.showwarning("Attention", "Cochez au moins un champ à modifier.", parent=win)
+                return
+            if scope_var.get() == "selection":
+                target, kwargs = f"{len(selected)} pièce(s) sélectionnée(s)", {'piece_ids': selected}
+            else:
+                target, kwargs = f"{total_label} pièce(s) de la recherche", {'filters': self.get_current_filters()}
+            if not messagebox.askyesno("Confirmation", f"Modifier {target} ?", parent=win):
+                return
+            win.destroy()
+            future = self.background_executor.submit(self.db_manager.bulk_update, changes, **kwargs)
+            self.update_status("Modification groupée en cours...", "loading")
+            self.progress_bar.start()
+            self.root.after(50, self.poll_bulk_update, future)
+
+        buttons = ttk.Frame(frame)
+        buttons.grid(row=len(fields) + 3, column=0, columnspan=2, sticky="ew", pady=(12, 0))
+        ttk.Button(buttons, text="Appliquer", command=apply, style="Success.TButton").pack(side=tk.LEFT, expand=True, fill=tk.X, padx=(0, 5))
+        ttk.Button(buttons, text="Annuler", command=win.destroy).pack(side=tk.LEFT, expand=True, fill=tk.X)
+
+    def poll_bulk_update(self, future):
+        if not future.done():
+            self.root.after(50, self.poll_bulk_update, future)
+            return
+        self.progress_bar.stop()
+        try:
+            updated = future.result()
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Erreur de modification groupée: {str(e)}")
+            self.update_status("Erreur modification groupée", "error")
+            return
+        if self.current_piece_id is not None and not self.editing_mode:
+            piece_data = self.db_manager.get_piece_by_id(self.current_piece_id)
+            if piece_data:
+                self.load_piece_details(piece_data)
+        self.update_status(f"{updated} pièce(s) modifiée(s).", "success")
+        self.load_data(keep_position=True)
+
     def cancel_changes(self):
         if self.editing_mode and messagebox.askyesno("Confirmation", "Voulez-vous annuler les modifications?"):
             self.editing_mode = False
@@ -1209,24 +2077,21 @@ class OCPPiecesManager:
         if not self.detail_vars["article"].get().strip():
             messagebox.showerror("Erreur", "Le champ Article est obligatoire")
             return
+        token = self.metrics.start("Sauvegarde")
         try:
             final_image_path = self.current_image
             old_piece_data = None
             if self.current_piece_id:
                  old_piece_data = self.db_manager.get_piece_by_id(self.current_piece_id)
-            if self.current_image and not self.current_image.startswith(self.images_folder):
+            if self.current_image and self.image_store.contains(self.current_image):
+                # Fichier choisi dans le dossier d'images : même forme de chemin que les autres pièces
+                final_image_path = self.image_store.stored_path(self.current_image)
+            elif self.current_image:
                 if os.path.exists(self.current_image):
-                    new_filename = f"piece_{self.current_piece_id or 'new'}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{os.path.splitext(self.current_image)[1]}"
-                    final_image_path = os.path.join(self.images_folder, new_filename)
-                    shutil.copy2(self.current_image, final_image_path)
-                    self.resize_image(final_image_path)
+                    final_image_path = self.image_store.store(self.current_image)
                 else:
                     messagebox.showwarning("Image manquante", "L'image sélectionnée n'existe plus. Seule la fiche sera sauvegardée.")
                     final_image_path = ""
-            if old_piece_data and old_piece_data[9] and old_piece_data[9] != final_image_path:
-                if os.path.exists(old_piece_data[9]):
-                    try: os.remove(old_piece_data[9])
-                    except: pass
             def clean_code_sap(val):
                 if val is None:
                     return ""
@@ -1246,29 +2111,19 @@ class OCPPiecesManager:
                 self.detail_vars["situation"].get().strip(),
                 final_image_path or ""
             )
-            champs = ["Article", "Code SAP", "Description", "Description longue", "Unité de mesure", "Statut", "Quantité installée", "Situation", "Image"]
             if self.current_piece_id is None:
                 new_id = self.db_manager.insert_piece(piece_data)
                 self.current_piece_id = new_id
-                if final_image_path and 'new' in final_image_path:
-                    new_final_path = final_image_path.replace('new', str(new_id))
-                    if os.path.exists(final_image_path):
-                        os.rename(final_image_path, new_final_path)
-                        self.db_manager.update_piece(new_id, piece_data[:-1] + (new_final_path,))
                 self.update_status(f"Pièce {new_id} créée.", "success")
-                # Historique détaillé création
-                new_data = {champs[i]: piece_data[i] for i in range(len(champs))}
-                self.log_history("Création", new_id, f"Article: {piece_data[0]}", old_data=None, new_data=new_data)
             else:
-                # Historique détaillé modification
-                old_data = {champs[i]: old_piece_data[i+1] for i in range(len(champs))} if old_piece_data else None
-                new_data = {champs[i]: piece_data[i] for i in range(len(champs))}
                 self.db_manager.update_piece(self.current_piece_id, piece_data)
                 self.update_status(f"Pièce {self.current_piece_id} mise à jour.", "success")
-                self.log_history("Modification", self.current_piece_id, f"Article: {piece_data[0]}", old_data=old_data, new_data=new_data)
+            # Ancienne image supprimée du magasin si plus aucune pièce ne l'utilise
+            if old_piece_data and old_piece_data[9] and old_piece_data[9] != final_image_path:
+                self.image_store.release([old_piece_data[9]])
             self.editing_mode = False
             self.update_button_states()
-            self.load_data()
+            self.load_data(keep_position=True, token=token)
         except Exception as e:
             messagebox.showerror("Erreur", f"Erreur de sauvegarde: {str(e)}")
             self.update_status("Erreur sauvegarde", "error")
@@ -1292,9 +2147,14 @@ class OCPPiecesManager:
         return tooltip
 
 def main():
+    # --server http://hôte:port (ou OCP_SERVER) : passer par le service partagé au lieu d'ouvrir ocp_pieces.db
+    parser = argparse.ArgumentParser(description="Gestionnaire de Pièces OCP")
+    parser.add_argument("--server", default=os.environ.get("OCP_SERVER"), help="adresse du service server_ocp")
+    parser.add_argument("--startup-report", action="store_true", help="afficher le rapport de démarrage (JSON) et quitter après la première page")
+    args, _ = parser.parse_known_args()
     root = tk.Tk()
     root.iconbitmap(resource_path('ocp.ico')) 
-    app = OCPPiecesManager(root)  
+    app = OCPPiecesManager(root, server_url=args.server, startup_report=args.startup_report)  
     root.protocol("WM_DELETE_WINDOW", app.on_closing)
     root.update_idletasks()
     x = (root.winfo_screenwidth() // 2) - (root.winfo_width() // 2)
@@ -1303,4 +2163,6 @@ def main():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Nécessaire au pool de processus dans l'exécutable PyInstaller
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -0,0 +1,586 @@
+"""Service local : un serveur HTTP/JSON possède la base, les postes l'interrogent au lieu d'ouvrir le fichier
+
+    python server_ocp.py serve --db ocp_pieces.db --port 8765
+    python server_ocp.py load --url http://127.0.0.1:8765 --clients 8 --duration 10
+    python interface_ocp.py --server http://127.0.0.1:8765      (ou variable d'environnement OCP_SERVER)
+
+Une seule instance de DatabaseManager sert tous les postes : ses caches restent chauds d'un poste à l'autre,
+et toutes les écritures passent par un thread unique qui les regroupe en transactions.
+Le service n'a pas d'authentification : l'écouter uniquement sur la machine ou le réseau de l'atelier.
+"""
+import argparse
+import http.client
+import json
+import queue
+import random
+import select
+import selectors
+import socket
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from database_ocp import DatabaseManager
+
+DEFAULT_PORT = 8765
+
+
+def as_tuples(value):
+    """Listes JSON -> tuples (clés de cache, tuples piece_data, bornes de pagination)"""
+    if isinstance(value, list):
+        return tuple(as_tuples(item) for item in value)
+    if isinstance(value, dict):
+        return {key: as_tuples(item) for key, item in value.items()}
+    return value
+
+
+class WriteBatcher:
+    """Thread unique d'écriture : les écritures reçues pendant une transaction partent ensemble dans la suivante"""
+    MAX_BATCH = 200
+
+    def __init__(self, db):
+        self.db = db
+        self.queue = queue.Queue()
+        self.writes = 0
+        self.batches = 0
+        self.thread = threading.Thread(target=self.run, name="ocp-ecriture", daemon=True)
+        self.thread.start()
+
+    def submit(self, method, params):
+        """Mettre une écriture en file et attendre son résultat (après COMMIT)"""
+        future = Future()
+        self.queue.put((method, params, future))
+        return future.result()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.MAX_BATCH:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self.execute(batch)
+
+    def execute(self, batch):
+        # Un SAVEPOINT par écriture : une écriture en échec est annulée seule, les autres sont validées
+        # par un unique COMMIT (et les caches ne sont mis à jour qu'après celui-ci)
+        outcomes = []
+        try:
+            with self.db.transaction():
+                for method, params, future in batch:
+                    try:
+                        with self.db.transaction():
+                            outcomes.append((future, getattr(self.db, method)(**params), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.writes += len(batch)
+        self.batches += 1
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+
+class PieceService:
+    """Méthodes de DatabaseManager exposées par le service (liste blanche)"""
+    READ_METHODS = frozenset((
+        "count_pieces", "search_pieces", "get_piece_by_id", "get_pieces_by_ids", "refine_pieces", "pieces_after",
+        "find_pieces_by_codes", "image_references", "image_paths_in_use", "search_history", "history_actions",
+        "cache_stats",
+    ))
+    WRITE_METHODS = frozenset((
+        "insert_piece", "update_piece", "delete_piece", "bulk_update", "set_image_paths", "clear_image_paths",
+        "rename_image_paths", "log_event",
+    ))
+
+    def __init__(self, db):
+        self.db = db
+        self.writer = WriteBatcher(db)
+        self.requests = 0
+        self.start = time.time()
+
+    def allowed(self, method):
+        # La maintenance des images (reconcile_image_flags, parcours du dossier) se lance sur la machine du service
+        return method in self.READ_METHODS or method in self.WRITE_METHODS
+
+    def call(self, method, params):
+        self.requests += 1
+        params = as_tuples(params)
+        if method in self.WRITE_METHODS:
+            return self.writer.submit(method, params)
+        return getattr(self.db, method)(**params)
+
+    def stats(self):
+        return {'requetes': self.requests, 'ecritures': self.writer.writes, 'transactions': self.writer.batches,
+                'secondes': round(time.time() - self.start, 1), 'caches': self.db.cache_stats()}
+
+
+class RpcHandler(BaseHTTPRequestHandler):
+    """POST /rpc {"method": ..., "params": {...}} -> {"result": ...} ; GET /stats"""
+    protocol_version = "HTTP/1.1"
+    # Lecture d'une requête commencée mais incomplète abandonnée au bout de ce délai
+    timeout = 30
+    # En-têtes et corps partent en deux écritures : sans TCP_NODELAY, l'ACK différé du client ajoute ~40 ms
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        # Une seule requête par passage : entre deux requêtes, la connexion attend hors du pool (IdleConnections)
+        self.close_connection = True
+        self.handle_one_request()
+
+    def do_POST(self):
+        if self.path != "/rpc":
+            self.send_json(404, {'error': f"Chemin inconnu : {self.path}"})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            method, params = request['method'], request.get('params') or {}
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_json(400, {'error': f"Requête invalide : {e}"})
+            return
+        service = self.server.service
+        if not service.allowed(method):
+            self.send_json(400, {'error': f"Méthode non autorisée : {method}"})
+            return
+        try:
+            result = service.call(method, params)
+        except Exception as e:
+            self.send_json(500, {'error': str(e), 'type': type(e).__name__})
+            return
+        self.send_json(200, {'result': result})
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self.send_json(200, self.server.service.stats())
+        else:
+            self.send_json(404, {'error': f"Chemin inconnu : {self.path}"})
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class IdleConnections:
+    """Connexions persistantes en attente de leur requête suivante, surveillées par un seul thread :
+    un worker n'est occupé que pendant le traitement d'une requête, jamais par un poste inactif"""
+    # Connexion sans requête fermée au bout de ce délai (le client en rouvre une à la demande)
+    IDLE_TIMEOUT = 60
+
+    def __init__(self, server):
+        self.server = server
+        self.selector = selectors.DefaultSelector()
+        self.parked = queue.Queue()
+        self.running = True
+        # Réveil du select() quand une connexion est rendue par un worker
+        self.wake_read, self.wake_write = socket.socketpair()
+        self.wake_read.setblocking(False)
+        self.selector.register(self.wake_read, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self.run, name="ocp-connexions", daemon=True)
+        self.thread.start()
+
+    def park(self, request, client_address):
+        """Rendre une connexion après sa réponse : elle repart vers le pool dès que la requête suivante arrive"""
+        self.parked.put((request, client_address))
+        self.wake_write.send(b"\0")
+
+    def stop(self):
+        self.running = False
+        self.wake_write.send(b"\0")
+        self.thread.join()
+
+    def run(self):
+        while self.running:
+            now = time.monotonic()
+            for key, _ in self.selector.select(timeout=1):
+                if key.fileobj is self.wake_read:
+                    try:
+                        self.wake_read.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    continue
+                # Requête (ou fermeture par le client) : traitée par un worker
+                self.selector.unregister(key.fileobj)
+                self.server.pool.submit(self.server.process_connection, key.fileobj, key.data[0])
+            while True:
+                try:
+                    request, client_address = self.parked.get_nowait()
+                except queue.Empty:
+                    break
+                self.selector.register(request, selectors.EVENT_READ, (client_address, now))
+            for key in list(self.selector.get_map().values()):
+                if key.data is not None and now - key.data[1] > self.IDLE_TIMEOUT:
+                    self.selector.unregister(key.fileobj)
+                    self.server.shutdown_request(key.fileobj)
+        for key in list(self.selector.get_map().values()):
+            if key.data is not None:
+                self.server.shutdown_request(key.fileobj)
+        self.selector.close()
+        self.wake_read.close()
+        self.wake_write.close()
+
+
+class PieceServer(ThreadingHTTPServer):
+    """Serveur HTTP à threads en nombre fixe : chaque worker garde sa connexion SQLite d'une requête à l'autre"""
+    daemon_threads = True
+
+    def __init__(self, address, db, workers=16):
+        super().__init__(address, RpcHandler)
+        self.service = PieceService(db)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ocp-rpc")
+        self.idle = IdleConnections(self)
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_connection, request, client_address)
+
+    def process_connection(self, request, client_address):
+        """Traiter une requête de la connexion, puis la rendre à IdleConnections (ou la fermer)"""
+        try:
+            handler = self.RequestHandlerClass(request, client_address, self)
+        except Exception:
+            self.handle_error(request, client_address)
+            self.shutdown_request(request)
+            return
+        if handler.close_connection:
+            self.shutdown_request(request)
+        else:
+            self.idle.park(request, client_address)
+
+    def server_close(self):
+        super().server_close()
+        self.idle.stop()
+        self.pool.shutdown(wait=False)
+        self.service.writer.stop()
+
+
+class RemoteError(sqlite3.Error):
+    """Erreur renvoyée par le service, ou service injoignable"""
+
+
+class RemoteDatabaseManager:
+    """Client du service : mêmes méthodes que DatabaseManager (une connexion HTTP persistante par thread)"""
+    EXCEL_COLUMNS = DatabaseManager.EXCEL_COLUMNS
+    PIECE_COLUMNS = DatabaseManager.PIECE_COLUMNS
+    HISTORY_FIELDS = DatabaseManager.HISTORY_FIELDS
+    BULK_FIELDS = DatabaseManager.BULK_FIELDS
+    EXPORT_CHUNK_SIZE = DatabaseManager.EXPORT_CHUNK_SIZE
+    TIMEOUT = 120
+    # Connexion persistante inactive depuis plus longtemps remplacée avant l'envoi (le service la ferme à 60 s)
+    MAX_IDLE = 30
+    # Seules les lectures sont renvoyées si la réponse se perd : une écriture a pu être exécutée par le service
+    RETRY_METHODS = PieceService.READ_METHODS
+
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.url = url
+        self.host, self.port = parts.hostname, parts.port or DEFAULT_PORT
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+        self.migration_stats = None
+        # Échec immédiat (RemoteError) si le service ne répond pas
+        self.call("cache_stats")
+
+    def http_connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None and (time.monotonic() - self.local.last_used > self.MAX_IDLE or self.connection_dropped(conn)):
+            self.drop_connection(conn)
+            conn = None
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.TIMEOUT)
+            self.local.conn = conn
+            self.local.used = False
+            with self.connections_lock:
+                self.connections.append(conn)
+        return conn
+
+    def connection_dropped(self, conn):
+        # Connexion au repos lisible : fermée par le service (ou données inattendues), inutilisable
+        return conn.sock is not None and bool(select.select([conn.sock], [], [], 0)[0])
+
+    def drop_connection(self, conn):
+        conn.close()
+        self.local.conn = None
+        with self.connections_lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+
+    def call(self, method, **params):
+        body = json.dumps({'method': method, 'params': params}, ensure_ascii=False).encode("utf-8")
+        while True:
+            conn = self.http_connection()
+            reused = self.local.used
+            try:
+                conn.request("POST", "/rpc", body, {"Content-Type": "application/json"})
+            except (OSError, http.client.HTTPException) as e:
+                self.drop_connection(conn)
+                # Envoi refusé : le service n'a pas reçu la requête complète, elle repart sur une nouvelle connexion
+                if reused:
+                    continue
+                raise RemoteError(f"Service {self.url} injoignable : {e}") from e
+            try:
+                response = conn.getresponse()
+                payload = json.loads(response.read())
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.drop_connection(conn)
+                # Requête envoyée : le service a pu l'exécuter, seule une lecture coupée net est renvoyée
+                if reused and method in self.RETRY_METHODS and not isinstance(e, TimeoutError):
+                    continue
+                raise RemoteError(f"Service {self.url} : réponse perdue ({e})") from e
+            self.local.used = True
+            self.local.last_used = time.monotonic()
+            break
+        if response.status != 200:
+            raise RemoteError(payload.get('error', f"Erreur HTTP {response.status}"))
+        return payload['result']
+
+    def close(self):
+        with self.connections_lock:
+            connections, self.connections = self.connections, []
+            self.local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    # Lectures (cancel_event n'est pas transmis : la requête se termine côté service)
+    def count_pieces(self, filters=None, estimate=False):
+        total, estimated = self.call("count_pieces", filters=filters, estimate=estimate)
+        return total, estimated
+
+    def search_pieces(self, filters=None, limit=1000, offset=0, sort="article", after=None, before=None, from_end=False,
+                      estimate_count=False, columns=None, cancel_event=None):
+        rows, total = self.call("search_pieces", filters=filters, limit=limit, offset=offset, sort=sort, after=after,
+                                before=before, from_end=from_end, estimate_count=estimate_count, columns=columns)
+        return [tuple(row) for row in rows], total
+
+    def filters_narrow(self, previous, current):
+        return DatabaseManager.filters_narrow(previous, current)
+
+    def refine_pieces(self, filters, candidate_ids, cancel_event=None):
+        return [tuple(row) for row in self.call("refine_pieces", filters=filters, candidate_ids=list(candidate_ids))]
+
+    def get_piece_by_id(self, piece_id):
+        row = self.call("get_piece_by_id", piece_id=piece_id)
+        return tuple(row) if row is not None else None
+
+    def get_pieces_by_ids(self, piece_ids):
+        # Clés JSON : les ids reviennent sous forme de texte
+        rows = self.call("get_pieces_by_ids", piece_ids=list(piece_ids))
+        return {int(piece_id): tuple(row) for piece_id, row in rows.items()}
+
+    def iter_pieces(self, filters=None, columns=None, chunk_size=None):
+        # Lots successifs par id croissant : aucun curseur ne reste ouvert sur le service
+        columns = list(columns or self.PIECE_COLUMNS)
+        last_id = 0
+        while True:
+            rows = self.call("pieces_after", filters=filters, after_id=last_id, limit=chunk_size or self.EXPORT_CHUNK_SIZE,
+                             columns=["id"] + columns)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            yield [tuple(row[1:]) for row in rows]
+
+    def export_to_excel(self, output_path, filters=None, progress_callback=None, cancel_event=None):
+        # Classeur écrit sur le poste, à partir des lots lus sur le service
+        return DatabaseManager.export_to_excel(self, output_path, filters, progress_callback, cancel_event)
+
+    def find_pieces_by_codes(self, codes):
+        matches = self.call("find_pieces_by_codes", codes=list(codes))
+        return {code: [tuple(piece) for piece in pieces] for code, pieces in matches.items()}
+
+    def image_references(self, paths):
+        return self.call("image_references", paths=list(paths))
+
+    def image_paths_in_use(self):
+        return self.call("image_paths_in_use")
+
+    def search_history(self, piece_id=None, action=None, date_from=None, date_to=None, before_id=None, after_id=None, limit=200):
+        rows = self.call("search_history", piece_id=piece_id, action=action, date_from=date_from, date_to=date_to,
+                         before_id=before_id, after_id=after_id, limit=limit)
+        return [tuple(row) for row in rows]
+
+    def history_actions(self):
+        return self.call("history_actions")
+
+    def cache_stats(self):
+        return self.call("cache_stats")
+
+    def invalidate_caches(self):
+        # Les caches sont ceux du service, qui les vide lui-même quand la base change (PRAGMA data_version)
+        pass
+
+    # Écritures (regroupées en transactions par le service)
+    def insert_piece(self, piece_data, action="Création"):
+        return self.call("insert_piece", piece_data=list(piece_data), action=action)
+
+    def update_piece(self, piece_id, piece_data, action="Modification"):
+        return self.call("update_piece", piece_id=piece_id, piece_data=list(piece_data), action=action)
+
+    def delete_piece(self, piece_id, action="Suppression"):
+        return self.call("delete_piece", piece_id=piece_id, action=action)
+
+    def bulk_update(self, changes, piece_ids=None, filters=None, action="Modification groupée"):
+        return self.call("bulk_update", changes=changes, piece_ids=list(piece_ids) if piece_ids is not None else None,
+                         filters=filters, action=action)
+
+    def set_image_paths(self, assignments, action="Import image"):
+        return self.call("set_image_paths", assignments=[list(item) for item in assignments], action=action)
+
+    def clear_image_paths(self, paths, action="Image manquante"):
+        return self.call("clear_image_paths", paths=list(paths), action=action)
+
+    def rename_image_paths(self, mapping):
+        return self.call("rename_image_paths", mapping=mapping)
+
+    def log_event(self, action, piece_id=None, details=None):
+        return self.call("log_event", action=action, piece_id=piece_id, details=details)
+
+    # Imports de fichiers : à lancer sur la machine du service (cli_ocp.py import)
+    def migrate_from_excel(self, excel_path, progress_callback=None):
+        self.migration_stats = {'error': "import à lancer sur la machine du service (cli_ocp.py import)"}
+        return False
+
+    def import_history_file(self, path):
+        raise RemoteError("Import de l'historique à lancer sur la machine du service")
+
+
+# Recherches du générateur de charge (valeurs courantes d'un catalogue)
+LOAD_FILTERS = (
+    {}, {'article': "POM"}, {'description': "POMPE"}, {'description': "VANNE INOX"}, {'statut': "Actif"},
+    {'situation': "MAGASIN"}, {'code_sap_empty': True}, {'description_longue': "inox"},
+)
+
+
+def percentile(values, ratio):
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run_client(target, direct, seed, deadline, write_ratio, ids):
+    """Un poste simulé (processus séparé) : recherches, lectures de fiche et écritures jusqu'à deadline
+    -> ({méthode: [durées en s]}, nombre d'erreurs, exemples d'erreurs)"""
+    rng = random.Random(seed)
+    db = DatabaseManager(target) if direct else RemoteDatabaseManager(target)
+    timings, errors, samples = {}, 0, []
+    while time.time() < deadline:
+        roll = rng.random()
+        piece_id = rng.choice(ids)
+        try:
+            if roll < write_ratio:
+                # Réenregistrement à l'identique, sans historique : le catalogue n'est pas modifié
+                piece = db.get_piece_by_id(piece_id)
+                method, start = "update_piece", time.perf_counter()
+                db.update_piece(piece_id, piece[1:10], action=None)
+            elif roll < write_ratio + (1 - write_ratio) / 2:
+                method, start = "get_piece_by_id", time.perf_counter()
+                db.get_piece_by_id(piece_id)
+            else:
+                method, start = "search_pieces", time.perf_counter()
+                db.search_pieces(filters=rng.choice(LOAD_FILTERS), limit=100, offset=100 * rng.randrange(5), columns=("id", "article"))
+        except Exception as e:
+            errors += 1
+            if len(samples) < 5:
+                samples.append(f"{type(e).__name__}: {e}")
+            continue
+        timings.setdefault(method, []).append(time.perf_counter() - start)
+    db.close()
+    return timings, errors, samples
+
+
+def load(args):
+    direct = args.db is not None
+    target = args.db if direct else args.url
+    probe = DatabaseManager(target) if direct else RemoteDatabaseManager(target)
+    ids = [row[0] for row in probe.search_pieces(limit=5000, columns=("id",))[0]]
+    probe.close()
+    if not ids:
+        print("Base vide : rien à mesurer.", file=sys.stderr)
+        return 1
+    # Un processus par poste simulé : ni le GIL ni les caches d'un client ne sont partagés
+    deadline = time.time() + args.duration
+    with ProcessPoolExecutor(max_workers=args.clients) as pool:
+        results = list(pool.map(run_client, [target] * args.clients, [direct] * args.clients, range(args.clients),
+                                [deadline] * args.clients, [args.write_ratio] * args.clients, [ids] * args.clients))
+    merged, errors, samples = {}, 0, []
+    for timings, client_errors, client_samples in results:
+        for method, values in timings.items():
+            merged.setdefault(method, []).extend(values)
+        errors += client_errors
+        samples += client_samples
+    requests = sum(len(values) for values in merged.values())
+    report = {'mode': "direct" if direct else "service", 'cible': target, 'clients': args.clients, 'secondes': args.duration,
+              'requetes': requests, 'requetes_par_seconde': round(requests / args.duration, 1), 'erreurs': errors,
+              'exemples_erreurs': samples[:5], 'methodes': {}}
+    for method, values in sorted(merged.items()):
+        values.sort()
+        report['methodes'][method] = {
+            'requetes': len(values), 'par_seconde': round(len(values) / args.duration, 1),
+            'moyenne_ms': round(statistics.fmean(values) * 1000, 2), 'p50_ms': round(percentile(values, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(values, 0.95) * 1000, 2), 'p99_ms': round(percentile(values, 0.99) * 1000, 2),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"{requests} requêtes en {args.duration} s : {report['requetes_par_seconde']} req/s, {errors} erreur(s)", file=sys.stderr)
+    return 0
+
+
+def serve(args):
+    db = DatabaseManager(args.db)
+    server = PieceServer((args.host, args.port), db, workers=args.workers)
+    print(f"Service OCP sur http://{args.host}:{args.port} (base {args.db}) - Ctrl+C pour arrêter", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        db.close()
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Service HTTP/JSON partagé sur la base des pièces OCP")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="démarrer le service")
+    serve_parser.add_argument("--db", default="ocp_pieces.db", help="base SQLite (défaut : ocp_pieces.db)")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="adresse d'écoute (0.0.0.0 pour les autres postes)")
+    serve_parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=16, help="requêtes traitées en parallèle")
+    load_parser = commands.add_parser("load", help="générateur de charge : requêtes par seconde et latences")
+    target = load_parser.add_mutually_exclusive_group()
+    target.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}", help="adresse du service")
+    target.add_argument("--db", help="ouvrir directement la base (comparaison avec l'accès partagé au fichier)")
+    load_parser.add_argument("--clients", type=int, default=8, help="postes simulés (un processus chacun)")
+    load_parser.add_argument("--duration", type=float, default=10, help="durée de la mesure (s)")
+    load_parser.add_argument("--write-ratio", type=float, default=0.1, help="part des requêtes en écriture")
+    args = parser.parse_args()
+    return serve(args) if args.command == "serve" else load(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())